@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the sqldiff introspection over a synthetic app of many models.
+
+Compares loading the schema catalog in bulk against introspecting table by
+table. Uses an SQLite database in a temporary directory unless
+DJANGO_SETTINGS_MODULE points to the settings of another database:
+
+    $ python benchmarks/sqldiff_introspection.py --models 1000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # NOQA
+from django.conf import settings  # NOQA
+
+
+def setup(tmpdir):
+    if not os.environ.get('DJANGO_SETTINGS_MODULE'):
+        settings.configure(
+            INSTALLED_APPS=['django.contrib.contenttypes', 'django_extensions'],
+            DATABASES={'default': {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(tmpdir, 'benchmark.sqlite3'),
+            }},
+        )
+    django.setup()
+
+
+def create_models(count):
+    from django.db import connection, models
+
+    app_models = []
+    for i in range(count):
+        attrs = {
+            '__module__': __name__,
+            'Meta': type(str('Meta'), (), {'app_label': 'django_extensions', 'db_table': 'benchmark_model%d' % i}),
+            'name': models.CharField(max_length=100, db_index=True),
+            'slug': models.SlugField(unique=True),
+            'amount': models.DecimalField(max_digits=10, decimal_places=2),
+            'created': models.DateTimeField(),
+            'notes': models.TextField(null=True),
+        }
+        if app_models:
+            attrs['parent'] = models.ForeignKey(app_models[-1], null=True, on_delete=models.CASCADE)
+        app_models.append(type(str('BenchmarkModel%d' % i), (models.Model, ), attrs))
+
+    # a transaction per table, a single one would hold too many locks
+    for model in app_models:
+        with connection.schema_editor() as editor:
+            editor.create_model(model)
+    return app_models
+
+
+def drop_models(app_models):
+    from django.db import connection
+
+    for model in reversed(app_models):
+        with connection.schema_editor() as editor:
+            editor.delete_model(model)
+
+
+def run(sqldiff_class, app_models):
+    from django.db import connection
+
+    start = time.time()
+    sqldiff = sqldiff_class(app_models, {'all_applications': False})
+    sqldiff.find_differences()
+    elapsed = time.time() - start
+    connection.close()
+    return elapsed, sqldiff.differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--models', type=int, default=1000, help="Number of models to create (default 1000)")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of runs, the best is reported (default 3)")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        setup(tmpdir)
+        from django.db import connection
+        from django_extensions.management.commands.sqldiff import DATABASE_SQLDIFF_CLASSES, GenericSQLDiff
+
+        engine = connection.settings_dict['ENGINE'].split('.')[-1]
+        sqldiff_class = DATABASE_SQLDIFF_CLASSES.get(engine, GenericSQLDiff)
+
+        class PerTableSQLDiff(sqldiff_class):
+            def can_load_catalog(self):
+                return False
+
+            def load_catalog(self):
+                pass
+
+        app_models = create_models(args.models)
+        try:
+            results = {}
+            for label, cls in (('per table', PerTableSQLDiff), ('catalog', sqldiff_class)):
+                timings = []
+                for _ in range(args.repeat):
+                    elapsed, differences = run(cls, app_models)
+                    timings.append(elapsed)
+                results[label] = (min(timings), differences)
+                print("%-10s %8.3fs" % (label, min(timings)))
+            if results['per table'][1] != results['catalog'][1]:
+                print("WARNING: the differences found do not match")
+            print("speedup    %8.1fx" % (results['per table'][0] / results['catalog'][0]))
+        finally:
+            drop_models(app_models)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
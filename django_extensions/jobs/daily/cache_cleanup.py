@@ -4,8 +4,17 @@ Daily cleanup job.
 
 Can be run as a cronjob to clean out old data from the database (only expired
 sessions at the moment).
+
+Expired entries are deleted in batches of CACHE_CLEANUP_BATCH_SIZE rows, each
+in a short transaction, sleeping CACHE_CLEANUP_SLEEP seconds between batches.
+Caches which still hold more than their MAX_ENTRIES are culled the same way.
+Multiple database caches are cleaned up in parallel.
 """
 
+import logging
+import sys
+import threading
+import time
 from contextlib import contextmanager
 
 import six
@@ -13,48 +22,166 @@ import six
 from django.utils import timezone
 from django_extensions.management.jobs import DailyJob
 
+logger = logging.getLogger(__name__)
+
 
 class Job(DailyJob):
     help = "Cache (db) cleanup Job"
 
+    batch_size = 1000
+    sleep = 0
+
     def execute(self):
         from django.conf import settings
         from django.db import transaction
         import os
 
         if hasattr(transaction, 'atomic'):
-            atomic = transaction.atomic
+            self.atomic = transaction.atomic
         else:
             @contextmanager
             def atomic(using=None):
                 yield
                 transaction.commit_unless_managed(using=using)
+            self.atomic = atomic
+
+        self.batch_size = getattr(settings, 'CACHE_CLEANUP_BATCH_SIZE', self.batch_size)
+        self.sleep = getattr(settings, 'CACHE_CLEANUP_SLEEP', self.sleep)
 
         if hasattr(settings, 'CACHES'):
             from django.core.cache import caches
-            from django.db import router, connections
+            from django.db import router
 
+            targets = {}
             for cache_name, cache_options in six.iteritems(settings.CACHES):
                 if cache_options['BACKEND'].endswith("DatabaseCache"):
-                    cache = caches[cache_name]
-                    db = router.db_for_write(cache.cache_model_class)
-                    with atomic(using=db):
-                        cursor = connections[db].cursor()
-                        now = timezone.now()
-                        cache._cull(db, cursor, now)
+                    db = router.db_for_write(caches[cache_name].cache_model_class)
+                    targets.setdefault((db, cache_options['LOCATION']), (cache_name, cache_options.get('OPTIONS', {})))
+
+            targets = [(db, table, cache_name, options) for (db, table), (cache_name, options) in sorted(targets.items())]
+            if len(targets) == 1:
+                self.cleanup_cache(*targets[0])
+            else:
+                errors = []
+                threads = [threading.Thread(target=self.cleanup_cache_thread, args=target + (errors, )) for target in targets]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                if errors:
+                    six.reraise(*errors[0])
             return
 
         if hasattr(settings, 'CACHE_BACKEND'):
             if settings.CACHE_BACKEND.startswith('db://'):
-                from django.db import connection
+                from django.db import DEFAULT_DB_ALIAS
                 os.environ['TZ'] = settings.TIME_ZONE
                 table_name = settings.CACHE_BACKEND[5:]
+                self.delete_expired(DEFAULT_DB_ALIAS, table_name, 'current_timestamp', [])
+
+    def cleanup_cache_thread(self, db, table_name, cache_name, options, errors):
+        from django.db import connections
+        try:
+            self.cleanup_cache(db, table_name, cache_name, options)
+        except Exception:
+            logger.exception("Cleanup of cache %s failed", cache_name)
+            errors.append(sys.exc_info())
+        finally:
+            connections[db].close()
+
+    def cleanup_cache(self, db, table_name, cache_name, options):
+        from django.db import connections
+
+        connection = connections[db]
+        now = timezone.now()
+        deleted = self.delete_expired(db, table_name, '%s', [connection.ops.adapt_datetimefield_value(now)])
+        logger.info("Deleted %d expired entries from cache %s", deleted, cache_name)
+
+        culled = self.cull(db, table_name, int(options.get('MAX_ENTRIES', 300)), int(options.get('CULL_FREQUENCY', 3)))
+        if culled:
+            logger.info("Culled %d entries from cache %s", culled, cache_name)
+
+    def delete_expired(self, db, table_name, now_sql, now_params):
+        """
+        Deletes the expired entries of a cache table in batches and returns
+        the number of deleted entries.
+        """
+        return self.delete_entries(db, table_name, "expires < %s" % now_sql, now_params)
+
+    def cull(self, db, table_name, max_entries, cull_frequency):
+        """
+        Deletes entries of a cache table holding more than max_entries like
+        the database cache does, 1 / cull_frequency of max_entries or all of
+        them when cull_frequency is 0, in batches. Returns the number of
+        deleted entries.
+        """
+        from django.db import connections
+
+        connection = connections[db]
+        table = connection.ops.quote_name(table_name)
+        if connection.vendor == 'oracle':
+            probe_sql = "SELECT cache_key FROM %s ORDER BY cache_key OFFSET %d ROWS FETCH FIRST 1 ROWS ONLY"
+        else:
+            probe_sql = "SELECT cache_key FROM %s ORDER BY cache_key LIMIT 1 OFFSET %d"
+        cursor = connection.cursor()
+        cursor.execute(probe_sql % (table, max_entries))
+        if cursor.fetchone() is None:
+            return 0
+        return self.delete_entries(
+            db, table_name, limit=max_entries // cull_frequency if cull_frequency else None, ordered=True)
+
+    def delete_entries(self, db, table_name, where_sql=None, params=None, limit=None, ordered=False):
+        """
+        Deletes the entries of a cache table matching where_sql in batches
+        and returns the number of deleted entries. At most limit entries are
+        deleted when it is given.
+
+        Without ordered every batch takes any matching entries, so an index
+        on the columns of where_sql finds them. With ordered the entries are
+        deleted in order of their keys, every batch continues after the last
+        key of the previous one instead of sorting the table again.
+        """
+        from django.db import connections
+
+        connection = connections[db]
+        table = connection.ops.quote_name(table_name)
+        params = list(params or [])
 
-                with atomic():
-                    cursor = connection.cursor()
+        deleted = 0
+        last_key = None
+        while limit is None or deleted < limit:
+            batch_size = self.batch_size if limit is None else min(self.batch_size, limit - deleted)
+            conditions = [where_sql] if where_sql else []
+            select_params = list(params)
+            if last_key is not None:
+                conditions.append("cache_key > %s")
+                select_params.append(last_key)
+            select_sql = "SELECT cache_key FROM %s" % table
+            if conditions:
+                select_sql += " WHERE %s" % " AND ".join(conditions)
+            if ordered:
+                select_sql += " ORDER BY cache_key"
+            if connection.vendor == 'oracle':
+                select_sql += " FETCH FIRST %d ROWS ONLY" % batch_size
+            else:
+                select_sql += " LIMIT %d" % batch_size
+            with self.atomic(using=db):
+                cursor = connection.cursor()
+                cursor.execute(select_sql, select_params)
+                keys = [row[0] for row in cursor.fetchall()]
+                if keys:
                     cursor.execute(
-                        "DELETE FROM %s WHERE %s < current_timestamp;" % (
-                            connection.ops.quote_name(table_name),
-                            connection.ops.quote_name('expires')
-                        )
+                        "DELETE FROM %s WHERE cache_key IN (%s)%s" % (
+                            table, ', '.join(['%s'] * len(keys)), " AND %s" % where_sql if where_sql else ""
+                        ),
+                        keys + params
                     )
+            deleted += len(keys)
+            if len(keys) < batch_size:
+                break
+            if ordered:
+                last_key = keys[-1]
+            logger.info("Deleted %d entries from %s", deleted, table_name)
+            if self.sleep:
+                time.sleep(self.sleep)
+        return deleted
@@ -30,18 +30,19 @@ Improvements:
 """
 
 import datetime
+import heapq
+import multiprocessing
 import sys
 
 import six
 from django.apps import apps
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.management.base import BaseCommand
-from django.db import router
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
 from django.db.models import (
     AutoField, BooleanField, DateField, DateTimeField, FileField, ForeignKey,
 )
-from django.db.models.deletion import Collector
 from django.utils.encoding import smart_text, force_text
 
 from django_extensions.management.utils import signalcommand
@@ -89,6 +90,30 @@ class Command(BaseCommand):
         parser.add_argument(
             '--autofield', action='store_false', dest='skip_autofield',
             default=True, help='Include Autofields (like pk fields)')
+        parser.add_argument(
+            '--stream', action='store_true', dest='stream', default=False,
+            help='Write the script while it is generated instead of building it in memory first')
+        parser.add_argument(
+            '--bulk', action='store_true', dest='bulk', default=False,
+            help='Restore the objects with bulk_create, keeping their primary keys')
+        parser.add_argument(
+            '--batch-size', type=int, dest='batch_size', default=1000,
+            help='Number of objects restored by each bulk_create call (default 1000)')
+        parser.add_argument(
+            '--jobs', type=int, dest='jobs', default=1,
+            help='Number of processes generating the code of the models (default 1)')
+        parser.add_argument(
+            '--filter', action='append', dest='filters', default=[], metavar='APP_LABEL.MODEL:LOOKUP=VALUE[&LOOKUP=VALUE]',
+            help='Only export the instances of the model matching all the lookups and the instances they refer to, '
+                 'can be used multiple times. Without --sample the models without a filter only export the '
+                 'instances the selected ones refer to')
+        parser.add_argument(
+            '--sample', type=int, dest='sample', default=None,
+            help='Only export the first N instances of every model and the instances they refer to')
+        parser.add_argument(
+            '--self-m2m-depth', type=int, dest='self_m2m_depth', default=1,
+            help='Number of links of many to many fields of a model to itself followed from the selected '
+                 'instances in a partial dump (default 1)')
 
     @signalcommand
     def handle(self, *args, **options):
@@ -102,6 +127,14 @@ class Command(BaseCommand):
         # This variable "context" will be passed around like the town bicycle.
         context = {}
 
+        # Partial dumps only export the selected instances
+        if options['filters'] or options['sample']:
+            filters = {}
+            for value in options['filters']:
+                model, lookup = parse_filter(value, models)
+                filters.setdefault(model, []).append(lookup)
+            context["__selected"] = select_instances(models, filters, options['sample'], options['self_m2m_depth'])
+
         # Create a dumpscript object and let it format itself as a string
         script = Script(
             models=models,
@@ -110,10 +143,107 @@ class Command(BaseCommand):
             stderr=self.stderr,
             options=options,
         )
-        self.stdout.write(str(script))
+        if options['stream']:
+            script.stream()
+        else:
+            self.stdout.write(str(script))
         self.stdout.write("\n")
 
 
+def parse_filter(value, models):
+    """ Parses a --filter value into the model and the lookup dictionary.
+        Lookups are separated by &, the values of __in lookups by commas.
+        Other values are converted by the fields, except True, False and
+        None.
+    """
+
+    lookups = {}
+    try:
+        model_label, lookup_string = value.split(":", 1)
+        model = apps.get_model(model_label)
+        for lookup in lookup_string.split("&"):
+            lookup_name, lookup_value = lookup.split("=", 1)
+            if lookup_name.endswith("__in"):
+                lookup_value = lookup_value.split(",")
+            else:
+                lookup_value = {"True": True, "False": False, "None": None}.get(lookup_value, lookup_value)
+            lookups[lookup_name] = lookup_value
+    except (ValueError, LookupError):
+        raise CommandError("Invalid filter %s, use APP_LABEL.MODEL:LOOKUP=VALUE[&LOOKUP=VALUE]" % value)
+
+    if model not in models:
+        raise CommandError("Invalid filter %s, %s is not exported" % (value, model_label))
+
+    return model, lookups
+
+
+def select_instances(models, filters, sample=None, self_m2m_depth=1):
+    """ Returns the primary keys of the instances to export by model for a
+        partial dump. These are the instances matching the filters of their
+        model, the first sample instances of every model when sample is given,
+        and all instances the selected ones refer to. Many to many fields of
+        a model to itself are only followed for self_m2m_depth links, these
+        can reach a large part of the table.
+    """
+
+    selected = {}
+    # the models and primary keys of the new instances, with the number of
+    # many to many links to their own model followed to reach them
+    pending = []
+
+    for model in models:
+        queryset = ModelCode(model=model).get_queryset()
+        if model in filters:
+            for lookup in filters[model]:
+                queryset = queryset.filter(**lookup)
+        elif not sample:
+            selected[model] = set()
+            continue
+        if sample:
+            queryset = queryset[:sample]
+        selected[model] = set(queryset.values_list('pk', flat=True))
+        pending.append((model, selected[model], 0))
+
+    # Walk the foreign keys and many to many fields of the new instances
+    while pending:
+        model, pks, depth = pending.pop(0)
+        for field in list(model._meta.fields) + list(model._meta.many_to_many):
+            if not field.rel or field.rel.to not in selected:
+                continue
+            related_model = field.rel.to
+            related_depth = 0
+            if field.many_to_many and related_model is model:
+                if depth >= self_m2m_depth:
+                    continue
+                related_depth = depth + 1
+            queryset = model._default_manager.values_list('%s__pk' % field.name, flat=True)
+            related_pks = set(pk for pk in iter_selected(queryset, pks) if pk is not None)
+            related_pks.difference_update(selected[related_model])
+            if related_pks:
+                selected[related_model].update(related_pks)
+                pending.append((related_model, related_pks, related_depth))
+
+    return selected
+
+
+def iter_selected(queryset, selected, field_name='pk'):
+    """ Iterates over the queryset, restricted to the given primary keys
+        unless these are None. These are queried in chunks, databases limit
+        the number of query parameters.
+    """
+
+    if selected is None:
+        for item in queryset.iterator():
+            yield item
+        return
+
+    pks = sorted(selected)
+    for start in range(0, len(pks), SELECTION_CHUNK_SIZE):
+        chunk = pks[start:start + SELECTION_CHUNK_SIZE]
+        for item in queryset.filter(**{'%s__in' % field_name: chunk}).iterator():
+            yield item
+
+
 def get_models(app_labels):
     """ Gets a list of models for the given app labels, with some exceptions.
         TODO: If a required model is referenced, it should also be included.
@@ -147,6 +277,10 @@ def get_models(app_labels):
     return models
 
 
+# Number of primary keys in a query for the instances of a partial dump
+SELECTION_CHUNK_SIZE = 500
+
+
 class Code(object):
     """ A snippet of python script.
         This keeps track of import statements and can be output to a string.
@@ -203,34 +337,215 @@ class ModelCode(Code):
         return {self.model.__name__: smart_text(self.model.__module__)}
     imports = property(get_imports)
 
+    def get_selected(self, model=None):
+        """ Returns the primary keys of the instances of the model (this one
+            by default) to export in a partial dump, or None to export all.
+        """
+        selected = self.context.get("__selected")
+        if selected is None:
+            return None
+        return selected.get(model or self.model, set())
+
+    def get_queryset(self):
+        """ Returns the instances to export. The primary key breaks ties in
+            the ordering, so every query returns them in the same order.
+        """
+        queryset = self.model._default_manager.all()
+        ordering = list(queryset.query.order_by) or list(self.model._meta.ordering)
+        return queryset.order_by(*(ordering + ['pk']))
+
+    def get_context_names(self):
+        """ Returns the context entries for the instances, as they are once
+            the model has been processed. Skipped parents are linked to their
+            subclassed instance in the context right away.
+        """
+        names = {}
+        subclasses = self.get_subclasses()
+
+        for counter, pk in enumerate(iter_selected(self.get_queryset().values_list('pk', flat=True), self.get_selected())):
+            key = get_context_key(self.model, pk)
+            if pk in subclasses:
+                names[key] = None
+                self.context["__subclassed"][key] = get_context_key(subclasses[pk], pk)
+            else:
+                # named like InstanceCode does
+                names[key] = "%s_%s" % (self.model._meta.db_table, counter + 1)
+
+        return names
+
+    def iter_blocks(self):
+        """ Yields the section of the model in the script, one block or
+            statement at a time.
+        """
+        yield "    # Processing model: %s.%s\n" % (self.model.__module__, self.model.__name__)
+        yield self.import_lines
+        yield ""
+        if self.options.get('bulk'):
+            model_lines = self.iter_bulk_lines()
+        else:
+            model_lines = self.iter_lines()
+        for lines in model_lines:
+            yield lines
+
     def get_lines(self):
         """ Returns a list of lists or strings, representing the code body.
             Each list is a block, each string is a statement.
         """
         code = []
 
-        for counter, item in enumerate(self.model._default_manager.all()):
-            instance = InstanceCode(instance=item, id=counter + 1, context=self.context, stdout=self.stdout, stderr=self.stderr, options=self.options)
-            self.instances.append(instance)
+        for lines in self.iter_lines():
+            code += lines
+
+        return code
+
+    lines = property(get_lines)
+
+    def iter_lines(self):
+        """ Yields the code body of each instance as soon as it is generated.
+            Only the instances that are still waiting for fields or relations
+            are kept in self.instances, so they can be processed again later.
+        """
+        self.instances = []
+        many_to_many = self.get_many_to_many()
+        subclasses = self.get_subclasses()
+
+        for counter, item in enumerate(iter_selected(self.get_queryset(), self.get_selected())):
+            related = dict((field, pairs.pop(item.pk, [])) for field, pairs in many_to_many.items())
+            instance = InstanceCode(instance=item, id=counter + 1, context=self.context, stdout=self.stdout, stderr=self.stderr, options=self.options, many_to_many=related, subclass=subclasses.pop(item.pk, None))
             if instance.waiting_list:
-                code += instance.lines
+                lines = instance.lines
+                if lines:
+                    yield lines
+            if instance.pending:
+                self.instances.append(instance)
 
         # After each instance has been processed, try again.
         # This allows self referencing fields to work.
         for instance in self.instances:
             if instance.waiting_list:
-                code += instance.lines
+                lines = instance.lines
+                if lines:
+                    yield lines
 
-        return code
+        self.instances = [instance for instance in self.instances if instance.pending]
 
-    lines = property(get_lines)
+    def iter_bulk_lines(self):
+        """ Yields the code that restores the instances in batches with
+            bulk_create, followed by the rows of the many to many tables. The
+            primary keys are kept, so foreign keys refer to them directly.
+        """
+        restored = []
+
+        for model_name, definition, items, fields in self.get_bulk_instances():
+            for lines in self.iter_bulk_create(model_name, items, fields):
+                if model_name not in restored:
+                    restored.append(model_name)
+                    if definition:
+                        yield [definition]
+                yield lines
+
+        if restored:
+            yield ["importer.reset_sequences([%s])" % ", ".join(restored), ""]
+
+    def get_bulk_instances(self):
+        """ Returns the variable name, its definition, an iterator over the
+            instances and the fields for the model and each of its many to many
+            tables.
+        """
+        selected = self.get_selected()
+        querysets = [(self.model.__name__, None, iter_selected(self.get_queryset(), selected), self.model._meta.concrete_fields)]
+
+        for field in self.model._meta.many_to_many:
+            through = field.rel.through
+            # Intermediate models that are not created automatically are
+            # exported as any other model
+            if not through._meta.auto_created:
+                continue
+            definition = "%s = %s.%s.through" % (through._meta.db_table, self.model.__name__, field.name)
+            fields = [f for f in through._meta.concrete_fields if not f.primary_key]
+            source = through._meta.get_field(field.m2m_field_name())
+            queryset = through._default_manager.order_by(through._meta.pk.name)
+            querysets.append((through._meta.db_table, definition, iter_selected(queryset, selected, source.attname), fields))
+
+        return querysets
+
+    def iter_bulk_create(self, model_name, items, fields):
+        """ Yields a bulk_create call for every batch of objects. """
+        batch_size = self.options.get('batch_size') or 1000
+        lines = []
+
+        for item in items:
+            kwargs = []
+            for field in fields:
+                try:
+                    kwargs.append(get_bulk_kwarg(item, field, self.context))
+                except SkipValue:
+                    continue
+            lines.append("    %s(%s)," % (model_name, ", ".join(kwargs)))
+            if len(lines) == batch_size:
+                yield ["importer.bulk_create(%s, [" % model_name] + lines + ["])", ""]
+                lines = []
+
+        if lines:
+            yield ["importer.bulk_create(%s, [" % model_name] + lines + ["])", ""]
+
+    def get_subclasses(self):
+        """ Returns the subclassed model by primary key for the instances that
+            are the parent of a single exported subclassed instance, reading
+            the parent links of each subclassed model in a single query.
+        """
+        subclasses = {}
+        ambiguous = set()
+
+        for model in self.context.get("__avaliable_models", ()):
+            parent_link = model._meta.parents.get(self.model)
+            if parent_link is None:
+                continue
+            queryset = model._default_manager.values_list(parent_link.attname, flat=True)
+            for pk in iter_selected(queryset, self.get_selected(model)):
+                if pk in subclasses:
+                    ambiguous.add(pk)
+                subclasses[pk] = model
+
+        for pk in ambiguous:
+            del subclasses[pk]
+
+        return subclasses
+
+    def get_many_to_many(self):
+        """ Returns a dictionary of the related primary keys by instance primary
+            key for each many to many field, read from the intermediate table in
+            a single query per field.
+        """
+        many_to_many = {}
+
+        for field in self.model._meta.many_to_many:
+            through = field.rel.through
+            source = through._meta.get_field(field.m2m_field_name())
+            target = through._meta.get_field(field.m2m_reverse_field_name())
+            # Intermediate models which do not link the primary keys are
+            # queried for each instance instead.
+            if not (source.rel.get_related_field().primary_key and target.rel.get_related_field().primary_key):
+                continue
+
+            pairs = many_to_many[field] = {}
+            queryset = through._default_manager.order_by(through._meta.pk.name)
+            queryset = queryset.values_list(source.attname, target.attname)
+            for source_pk, target_pk in iter_selected(queryset, self.get_selected(), source.attname):
+                pairs.setdefault(source_pk, []).append(target_pk)
+
+        return many_to_many
 
 
 class InstanceCode(Code):
     """ Produces a python script that can recreate data for a given model instance. """
 
-    def __init__(self, instance, id, context=None, stdout=None, stderr=None, options=None):
-        """ We need the instance in question and an id """
+    def __init__(self, instance, id, context=None, stdout=None, stderr=None, options=None, many_to_many=None, subclass=None):
+        """ We need the instance in question and an id. The primary keys of
+            the related objects of many to many fields are queried unless they
+            are given in many_to_many. subclass is the model of the single
+            subclassed instance of this instance, if any.
+        """
 
         super(InstanceCode, self).__init__(indent=0, stdout=stdout, stderr=stderr)
         self.imports = {}
@@ -242,14 +557,25 @@ class InstanceCode(Code):
             context = {}
         self.context = context
         self.variable_name = "%s_%s" % (self.instance._meta.db_table, id)
+        self.subclass = subclass
         self.skip_me = None
         self.instantiated = False
 
         self.waiting_list = list(self.model._meta.fields)
 
+        if many_to_many is None:
+            many_to_many = {}
         self.many_to_many_waiting_list = {}
         for field in self.model._meta.many_to_many:
-            self.many_to_many_waiting_list[field] = list(getattr(self.instance, field.name).all())
+            if field in many_to_many:
+                self.many_to_many_waiting_list[field] = list(many_to_many[field])
+            else:
+                self.many_to_many_waiting_list[field] = list(getattr(self.instance, field.name).values_list('pk', flat=True))
+            # partial dumps leave out links to instances which are not exported
+            selected = self.context.get("__selected")
+            if selected is not None:
+                related_pks = selected.get(field.rel.to, set())
+                self.many_to_many_waiting_list[field] = [pk for pk in self.many_to_many_waiting_list[field] if pk in related_pks]
 
     def get_lines(self, force=False):
         """ Returns a list of lists or strings, representing the code body.
@@ -288,6 +614,13 @@ class InstanceCode(Code):
         return code_lines
     lines = property(get_lines)
 
+    def is_pending(self):
+        """ Whether some fields or relations of this instance still have to be written. """
+        if self.skip_me:
+            return False
+        return bool(self.waiting_list) or any(self.many_to_many_waiting_list.values())
+    pending = property(is_pending)
+
     def skip(self):
         """ Determine whether or not this object should be skipped.
             If this model instance is a parent of a single subclassed
@@ -300,18 +633,13 @@ class InstanceCode(Code):
         if self.skip_me is not None:
             return self.skip_me
 
-        cls = self.instance.__class__
-        using = router.db_for_write(cls, instance=self.instance)
-        collector = Collector(using=using)
-        collector.collect([self.instance], collect_related=False)
-        sub_objects = sum([list(i) for i in collector.data.values()], [])
-        sub_objects_parents = [so._meta.parents for so in sub_objects]
-        if [self.model in p for p in sub_objects_parents].count(True) == 1:
+        if self.subclass is not None:
             # since this instance isn't explicitly created, it's variable name
             # can't be referenced in the script, so record None in context dict
-            pk_name = self.instance._meta.pk.name
-            key = '%s_%s' % (self.model.__name__, getattr(self.instance, pk_name))
+            # and link it to the subclassed instance
+            key = get_context_key(self.model, self.instance.pk)
             self.context[key] = None
+            self.context["__subclassed"][key] = get_context_key(self.subclass, self.instance.pk)
             self.skip_me = True
         else:
             self.skip_me = False
@@ -328,9 +656,7 @@ class InstanceCode(Code):
             self.instantiated = True
 
             # Store our variable name for future foreign key references
-            pk_name = self.instance._meta.pk.name
-            key = '%s_%s' % (self.model.__name__, getattr(self.instance, pk_name))
-            self.context[key] = self.variable_name
+            self.context[get_context_key(self.model, self.instance.pk)] = self.variable_name
 
         return code_lines
 
@@ -362,20 +688,19 @@ class InstanceCode(Code):
 
         lines = []
 
-        for field, rel_items in self.many_to_many_waiting_list.items():
-            for rel_item in list(rel_items):
+        for field, rel_pks in self.many_to_many_waiting_list.items():
+            for rel_pk in list(rel_pks):
                 try:
-                    pk_name = rel_item._meta.pk.name
-                    key = '%s_%s' % (rel_item.__class__.__name__, getattr(rel_item, pk_name))
-                    value = "%s" % self.context[key]
+                    value = "%s" % get_variable_name(self.context, get_context_key(field.rel.to, rel_pk))
                     lines.append('%s.%s.add(%s)' % (self.variable_name, field.name, value))
-                    self.many_to_many_waiting_list[field].remove(rel_item)
+                    self.many_to_many_waiting_list[field].remove(rel_pk)
                 except KeyError:
                     if force:
+                        rel_item = field.rel.to._default_manager.get(pk=rel_pk)
                         item_locator = orm_item_locator(rel_item)
                         self.context["__extra_imports"][rel_item._meta.object_name] = rel_item.__module__
                         lines.append('%s.%s.add( %s )' % (self.variable_name, field.name, item_locator))
-                        self.many_to_many_waiting_list[field].remove(rel_item)
+                        self.many_to_many_waiting_list[field].remove(rel_pk)
 
         if lines:
             lines.append("")
@@ -397,6 +722,7 @@ class Script(Code):
 
         self.context["__avaliable_models"] = set(models)
         self.context["__extra_imports"] = {}
+        self.context["__subclassed"] = {}
 
         self.options = options
 
@@ -404,45 +730,28 @@ class Script(Code):
         """ Works an an appropriate ordering for the models.
             This isn't essential, but makes the script look nicer because
             more instances can be defined on their first try.
-        """
 
-        # Max number of cycles allowed before we call it an infinite loop.
-        MAX_CYCLES = 5
-
-        model_queue = []
-        number_remaining_models = len(models)
-        allowed_cycles = MAX_CYCLES
-
-        while number_remaining_models > 0:
-            previous_number_remaining_models = number_remaining_models
+            The models of cyclic structures, and those related to models that
+            are not exported by many to many fields, are left in the models
+            list (as model code objects) to be processed a second time.
+        """
 
-            model = models.pop(0)
+        sorted_models, cycles = sort_models(models, context["__avaliable_models"])
 
-            # If the model is ready to be processed, add it to the list
-            if check_dependencies(model, model_queue, context["__avaliable_models"]):
-                model_class = ModelCode(model=model, context=context, stdout=self.stdout, stderr=self.stderr, options=self.options)
-                model_queue.append(model_class)
+        second_pass = set()
+        for cycle in cycles:
+            self.stderr.write('Cyclic foreign keys between models: %s\n' % ", ".join(
+                "%s.%s" % (model.__module__, model.__name__) for model in cycle))
+            second_pass.update(cycle)
+        for model in models:
+            for field in model._meta.many_to_many:
+                if field.rel.to not in context["__avaliable_models"] and field.rel.to is not ContentType:
+                    second_pass.add(model)
 
-            # Otherwise put the model back at the end of the list
-            else:
-                models.append(model)
-
-            # Check for infinite loops.
-            # This means there is a cyclic foreign key structure
-            # That cannot be resolved by re-ordering
-            number_remaining_models = len(models)
-            if number_remaining_models == previous_number_remaining_models:
-                allowed_cycles -= 1
-                if allowed_cycles <= 0:
-                    # Add the remaining models, but do not remove them from the model list
-                    missing_models = [ModelCode(model=m, context=context, stdout=self.stdout, stderr=self.stderr, options=self.options) for m in models]
-                    model_queue += missing_models
-                    # Replace the models with the model class objects
-                    # (sure, this is a little bit of hackery)
-                    models[:] = missing_models
-                    break
-            else:
-                allowed_cycles = MAX_CYCLES
+        model_queue = [ModelCode(model=m, context=context, stdout=self.stdout, stderr=self.stderr, options=self.options) for m in sorted_models]
+        # Replace the models with the model class objects
+        # (sure, this is a little bit of hackery)
+        models[:] = [model_class for model_class in model_queue if model_class.model in second_pass]
 
         return model_queue
 
@@ -450,34 +759,116 @@ class Script(Code):
         """ Returns a list of lists or strings, representing the code body.
             Each list is a block, each string is a statement.
         """
-        code = [self.FILE_HEADER.strip()]
+        code = list(self.iter_blocks())
+
+        for key, value in self.context["__extra_imports"].items():
+            code.insert(2, "    from %s import %s" % (value, key))
+
+        return code
+
+    lines = property(get_lines)
+
+    def iter_blocks(self):
+        """ Yields the code body one block or statement at a time, without
+            the imports of the objects that are not exported.
+        """
+        yield self.FILE_HEADER.strip()
+        yield "    # Initial Imports"
+        yield ""
 
         # Queue and process the required models
-        for model_class in self._queue_models(self.models, context=self.context):
-            msg = 'Processing model: %s.%s\n' % (model_class.model.__module__, model_class.model.__name__)
-            self.stderr.write(msg)
-            code.append("    # " + msg)
-            code.append(model_class.import_lines)
-            code.append("")
-            code.append(model_class.lines)
+        model_queue = self._queue_models(self.models, context=self.context)
 
-        # Process left over foreign keys from cyclic models
+        if self.options.get('jobs', 1) > 1:
+            model_blocks = self.iter_parallel_blocks(model_queue)
+        else:
+            model_blocks = self.iter_model_blocks(model_queue)
+        for block in model_blocks:
+            yield block
+
+        # Process left over foreign keys from cyclic models, with bulk_create
+        # these refer to the primary keys instead
+        if self.options.get('bulk'):
+            return
         for model in self.models:
             msg = 'Re-processing model: %s.%s\n' % (model.model.__module__, model.model.__name__)
             self.stderr.write(msg)
-            code.append("    # " + msg)
+            yield "    # " + msg
             for instance in model.instances:
-                if instance.waiting_list or instance.many_to_many_waiting_list:
-                    code.append(instance.get_lines(force=True))
-
-        code.insert(1, "    # Initial Imports")
-        code.insert(2, "")
-        for key, value in self.context["__extra_imports"].items():
-            code.insert(2, "    from %s import %s" % (value, key))
-
-        return code
+                if instance.pending:
+                    yield instance.get_lines(force=True)
+
+    def iter_model_blocks(self, model_queue):
+        """ Yields the sections of the models, one block or statement at a time. """
+        for model_class in model_queue:
+            self.stderr.write('Processing model: %s.%s\n' % (model_class.model.__module__, model_class.model.__name__))
+            for block in model_class.iter_blocks():
+                yield block
+
+    def iter_parallel_blocks(self, model_queue):
+        """ Yields the sections of the models, generated by --jobs worker
+            processes. The context entries of the instances are computed up
+            front, the task of a model only carries those of the models it
+            refers to. Models of cyclic structures refer to each other's
+            instances while they are processed, this process generates them.
+        """
+        bulk = self.options.get('bulk')
+        parallel_models = [m for m in model_queue if bulk or m not in self.models]
+
+        names = {}
+        if not bulk:
+            for model_class in model_queue:
+                label = get_model_label(model_class.model)
+                names[label] = model_class.get_context_names()
+                if model_class in parallel_models:
+                    self.context.update(names[label])
+
+        options = dict((key, self.options.get(key)) for key in ('skip_autofield', 'bulk', 'batch_size'))
+        avaliable_models = self.context["__avaliable_models"]
+
+        def iter_tasks():
+            # Only the models a model refers to, and the subclasses creating
+            # their skipped parents, are looked up in its context
+            for model_class in parallel_models:
+                task_names = {}
+                for dependency in get_dependencies(model_class.model, avaliable_models):
+                    task_names.update(names.get(get_model_label(dependency), {}))
+                yield get_model_label(model_class.model), task_names
+
+        # the worker processes must not share database connections with us
+        connections.close_all()
+        state = (options, avaliable_models, self.context.get("__selected"), self.context["__subclassed"])
+        pool = multiprocessing.Pool(self.options['jobs'], init_worker, state)
+        try:
+            sections = pool.imap(generate_model_code, iter_tasks())
+            for model_class in model_queue:
+                if model_class not in parallel_models:
+                    for block in self.iter_model_blocks([model_class]):
+                        yield block
+                    continue
+                code, extra_imports = next(sections)
+                self.stderr.write('Processing model: %s.%s\n' % (model_class.model.__module__, model_class.model.__name__))
+                self.context["__extra_imports"].update(extra_imports)
+                yield code
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def stream(self):
+        """ Writes the script to stdout while it is generated, so memory use
+            does not grow with the number of exported instances. The imports of
+            objects that are not exported are written just before the first
+            block that needs them.
+        """
+        extra_imports = set()
 
-    lines = property(get_lines)
+        for block in self.iter_blocks():
+            for key, value in self.context["__extra_imports"].items():
+                if key not in extra_imports:
+                    extra_imports.add(key)
+                    self.stdout.write("    from %s import %s\n" % (value, key))
+            self.stdout.write(flatten_blocks([block], num_indents=self.indent) + "\n")
 
     # A user-friendly file header
     FILE_HEADER = """
@@ -510,7 +901,8 @@ class Script(Code):
 # you must make sure ./some_folder/__init__.py exists
 # and run  ./manage.py runscript some_folder.some_script
 import os, sys
-from django.db import transaction
+from django.core.management.color import no_style
+from django.db import connection, transaction
 
 class BasicImportHelper(object):
 
@@ -580,6 +972,23 @@ class BasicImportHelper(object):
             raise
         return the_obj
 
+    def bulk_create(self, model, objs):
+        # Change this if you want to locate the objects in the database
+        with connection.constraint_checks_disabled():
+            if model._meta.parents:
+                # bulk_create does not support multi-table inheritance
+                for obj in objs:
+                    self.save_or_locate(obj)
+            else:
+                model._base_manager.bulk_create(objs)
+
+    def reset_sequences(self, models):
+        # The primary keys have been restored as well, new objects
+        # must get the ones after them
+        cursor = connection.cursor()
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
 
 importer = None
 try:
@@ -639,6 +1048,10 @@ def flatten_blocks(lines, num_indents=-1):
 def get_attribute_value(item, field, context, force=False, skip_autofield=True):
     """ Gets a string version of the given attribute's value, like repr() might. """
 
+    # ForeignKey fields are read from their column, see get_foreign_key_value
+    if isinstance(field, ForeignKey):
+        return get_foreign_key_value(item, field, context, force=force)
+
     # Find the value of the field, catching any database issues
     try:
         value = getattr(item, field.name)
@@ -657,35 +1070,6 @@ def get_attribute_value(item, field, context, force=False, skip_autofield=True):
     elif isinstance(field, FileField):
         return repr(force_text(value))
 
-    # ForeignKey fields, link directly using our stored python variable name
-    elif isinstance(field, ForeignKey) and value is not None:
-
-        # Special case for contenttype foreign keys: no need to output any
-        # content types in this script, as they can be generated again
-        # automatically.
-        # NB: Not sure if "is" will always work
-        if field.rel.to is ContentType:
-            return 'ContentType.objects.get(app_label="%s", model="%s")' % (value.app_label, value.model)
-
-        # Generate an identifier (key) for this foreign object
-        pk_name = value._meta.pk.name
-        key = '%s_%s' % (value.__class__.__name__, getattr(value, pk_name))
-
-        if key in context:
-            variable_name = context[key]
-            # If the context value is set to None, this should be skipped.
-            # This identifies models that have been skipped (inheritance)
-            if variable_name is None:
-                raise SkipValue()
-            # Return the variable name listed in the context
-            return "%s" % variable_name
-        elif value.__class__ not in context["__avaliable_models"] or force:
-            context["__extra_imports"][value._meta.object_name] = value.__module__
-            item_locator = orm_item_locator(value)
-            return item_locator
-        else:
-            raise DoLater('(FK) %s.%s\n' % (item.__class__.__name__, field.name))
-
     elif isinstance(field, (DateField, DateTimeField)) and value is not None:
         return "dateutil.parser.parse(\"%s\")" % value.isoformat()
 
@@ -694,6 +1078,137 @@ def get_attribute_value(item, field, context, force=False, skip_autofield=True):
         return repr(value)
 
 
+def get_foreign_key_value(item, field, context, force=False):
+    """ Gets a string version of a foreign key, linking directly to our stored
+        python variable name. The related object is only loaded when it has to
+        be located by the generated script.
+    """
+
+    related_model = field.rel.to
+    related_pk = getattr(item, field.attname)
+
+    if related_pk is None:
+        return repr(None)
+
+    def get_related_object():
+        try:
+            return getattr(item, field.name)
+        except ObjectDoesNotExist:
+            raise SkipValue('Could not find object for %s.%s, ignoring.\n' % (item.__class__.__name__, field.name))
+
+    # The column holds another value than the primary key (to_field)
+    if not field.rel.get_related_field().primary_key:
+        related_pk = get_related_object().pk
+
+    # Special case for contenttype foreign keys: no need to output any
+    # content types in this script, as they can be generated again
+    # automatically.
+    # NB: Not sure if "is" will always work
+    if related_model is ContentType:
+        try:
+            value = ContentType.objects.db_manager(item._state.db).get_for_id(related_pk)
+        except ContentType.DoesNotExist:
+            value = get_related_object()
+        return 'ContentType.objects.get(app_label="%s", model="%s")' % (value.app_label, value.model)
+
+    # Generate an identifier (key) for this foreign object
+    key = get_context_key(related_model, related_pk)
+
+    # The parent is created by this subclassed instance (inheritance)
+    if field.rel.parent_link and key in context and context[key] is None:
+        raise SkipValue()
+
+    try:
+        variable_name = get_variable_name(context, key)
+    except KeyError:
+        # Not processed yet, or a skipped parent whose subclassed instance
+        # is not created yet
+        pass
+    else:
+        # If the context value is set to None, this should be skipped.
+        if variable_name is None:
+            raise SkipValue()
+        # Return the variable name listed in the context
+        return "%s" % variable_name
+
+    if related_model not in context["__avaliable_models"] or force:
+        value = get_related_object()
+        context["__extra_imports"][value._meta.object_name] = value.__module__
+        item_locator = orm_item_locator(value)
+        return item_locator
+    else:
+        raise DoLater('(FK) %s.%s\n' % (item.__class__.__name__, field.name))
+
+
+def get_model_label(model):
+    return (model._meta.app_label, model._meta.object_name)
+
+
+_worker_state = {}
+
+
+def init_worker(options, avaliable_models, selected, subclassed):
+    """ Sets up a worker process of dumpscript --jobs. """
+    _worker_state.update(options=options, avaliable_models=avaliable_models, selected=selected,
+                         subclassed=subclassed)
+
+
+def generate_model_code(task):
+    """ Returns the code of the section of a model and the imports of the
+        objects that are not exported, in a worker process. task is the label
+        of the model and the context names of the instances it refers to.
+    """
+    model_label, names = task
+    model = apps.get_model(*model_label)
+
+    context = {
+        "__avaliable_models": _worker_state["avaliable_models"],
+        "__extra_imports": {},
+        "__subclassed": dict(_worker_state["subclassed"]),
+        "__selected": _worker_state["selected"],
+    }
+    context.update(names)
+
+    model_class = ModelCode(model=model, context=context, options=_worker_state["options"])
+    code = "\n".join(flatten_blocks([block]) for block in model_class.iter_blocks())
+    return code, context["__extra_imports"]
+
+
+def get_bulk_kwarg(item, field, context):
+    """ Gets the constructor keyword argument for the given attribute. The
+        primary keys are kept, so foreign keys to exported objects are given
+        by their column value.
+    """
+
+    if isinstance(field, ForeignKey):
+        value = getattr(item, field.attname)
+        if value is not None and field.rel.to is ContentType:
+            value = ContentType.objects.db_manager(item._state.db).get_for_id(value)
+            return '%s=ContentType.objects.get_by_natural_key("%s", "%s")' % (field.name, value.app_label, value.model)
+        if value is not None and field.rel.to not in context["__avaliable_models"]:
+            return "%s=%s" % (field.name, get_foreign_key_value(item, field, context, force=True))
+        return "%s=%r" % (field.attname, value)
+
+    return "%s=%s" % (field.name, get_attribute_value(item, field, context, skip_autofield=False))
+
+
+def get_variable_name(context, key):
+    """ Returns the variable name of the object with the given context key.
+        Parents that are skipped resolve to the variable name of the subclassed
+        instance that creates them.
+    """
+    variable_name = context[key]
+    while variable_name is None and key in context["__subclassed"]:
+        key = context["__subclassed"][key]
+        variable_name = context[key]
+    return variable_name
+
+
+def get_context_key(model, pk_value):
+    """ Returns the key of an object in the context dictionary. """
+    return '%s_%s' % (model.__name__, pk_value)
+
+
 def make_clean_dict(the_dict):
     if "_state" in the_dict:
         clean_dict = the_dict.copy()
@@ -702,25 +1217,114 @@ def make_clean_dict(the_dict):
     return the_dict
 
 
-def check_dependencies(model, model_queue, avaliable_models):
-    """ Check that all the depenedencies for this model are already in the queue. """
-
-    # A list of allowed links: existing fields, itself and the special case ContentType
-    allowed_links = [m.model.__name__ for m in model_queue] + [model.__name__, 'ContentType']
+def get_dependencies(model, avaliable_models):
+    """ Returns the other exported models this model refers to. """
 
-    # For each ForeignKey or ManyToMany field, check that a link is possible
+    dependencies = set()
 
-    for field in model._meta.fields:
-        if field.rel and field.rel.to.__name__ not in allowed_links:
-            if field.rel.to not in avaliable_models:
+    # For each ForeignKey or ManyToMany field, the special case ContentType
+    # aside, the related model must be created first
+    for field in list(model._meta.fields) + list(model._meta.many_to_many):
+        if field.rel and field.rel.to is not model and field.rel.to in avaliable_models:
+            dependencies.add(field.rel.to)
+            if field.rel.parent_link:
                 continue
-            return False
+            # Skipped parents are created by their subclassed instances, so
+            # the exported subclasses of the related model come first too
+            for subclass in avaliable_models:
+                if subclass is not model and field.rel.to in subclass._meta.get_parent_list():
+                    dependencies.add(subclass)
 
-    for field in model._meta.many_to_many:
-        if field.rel and field.rel.to.__name__ not in allowed_links:
-            return False
+    return dependencies
+
+
+def sort_models(models, avaliable_models):
+    """ Sorts the models so that each one comes after the models it refers to,
+        using Kahn's algorithm on the strongly connected components of their
+        dependencies. Otherwise the original order is kept. Returns the sorted
+        models and the cycles, lists of models that refer to each other.
+    """
 
-    return True
+    index = dict((model, i) for i, model in enumerate(models))
+    dependencies = dict((model, [m for m in get_dependencies(model, avaliable_models) if m in index]) for model in models)
+    components = get_strongly_connected_components(models, dependencies)
+
+    component_of = {}
+    for number, component in enumerate(components):
+        component.sort(key=index.get)
+        for model in component:
+            component_of[model] = number
+
+    waiting = [set() for component in components]
+    dependents = [set() for component in components]
+    for model in models:
+        for dependency in dependencies[model]:
+            if component_of[model] != component_of[dependency]:
+                waiting[component_of[model]].add(component_of[dependency])
+                dependents[component_of[dependency]].add(component_of[model])
+
+    ready = [(index[component[0]], number) for number, component in enumerate(components) if not waiting[number]]
+    heapq.heapify(ready)
+    sorted_models = []
+    while ready:
+        first, number = heapq.heappop(ready)
+        sorted_models += components[number]
+        for dependent in dependents[number]:
+            waiting[dependent].discard(number)
+            if not waiting[dependent]:
+                heapq.heappush(ready, (index[components[dependent][0]], dependent))
+
+    cycles = [component for component in components if len(component) > 1]
+    cycles.sort(key=lambda component: index[component[0]])
+    return sorted_models, cycles
+
+
+def get_strongly_connected_components(nodes, edges):
+    """ Tarjan's algorithm, without recursion so deep chains of models do not
+        hit the recursion limit.
+    """
+
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(edges[root]))]
+
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(edges[child])))
+                    break
+                elif child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        child = stack.pop()
+                        on_stack.discard(child)
+                        component.append(child)
+                        if child is node:
+                            break
+                    components.append(component)
+
+    return components
 
 
 # EXCEPTIONS
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 from django.core.management.base import BaseCommand
 
-from django_extensions.management.jobs import get_job, print_jobs
+from django_extensions.management.jobs import get_job, print_jobs, run_job
 from django_extensions.management.utils import signalcommand
 
 
@@ -31,7 +31,7 @@ class Command(BaseCommand):
             print("Use -l option to view all the available jobs")
             return
         try:
-            job().execute()
+            run_job(job())
         except Exception:
             import traceback
             print("ERROR OCCURED IN JOB: %s (APP: %s)" % (job_name, app_name))
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
+import importlib
+
 from django.apps import apps
 from django.core.management.base import BaseCommand
 
+from django_extensions.management.job_executors import get_executor
 from django_extensions.management.jobs import get_jobs, print_jobs
 from django_extensions.management.utils import signalcommand
 
@@ -19,57 +22,76 @@ class Command(BaseCommand):
         parser.add_argument(
             '--list', '-l', action="store_true", dest="list_jobs",
             help="List all jobs with their description")
+        parser.add_argument(
+            '--executor', '-e', dest='executor',
+            help="Executor running the jobs: inline, multiprocessing, database or the dotted path "
+                 "to an executor class. Defaults to settings.RUNJOBS_EXECUTOR or inline.")
+        parser.add_argument(
+            '--processes', '-p', type=int, dest='processes',
+            help="Number of worker processes used by the multiprocessing executor")
 
     def usage_msg(self):
         print("%s Please specify: %s" % (self.help, ', '.join(self.when_options)))
 
+    def get_executor(self, options):
+        executor_options = {'verbosity': int(options.get('verbosity', 1))}
+        if options.get('processes'):
+            executor_options['processes'] = options['processes']
+        return get_executor(options.get('executor'), **executor_options)
+
     def runjobs(self, when, options):
         verbosity = int(options.get('verbosity', 1))
+        executor = self.get_executor(options)
         jobs = get_jobs(when, only_scheduled=True)
         for app_name, job_name in sorted(jobs.keys()):
             job = jobs[(app_name, job_name)]
             if verbosity > 1:
                 print("Executing %s job: %s (app: %s)" % (when, job_name, app_name))
-            try:
-                job().execute()
-            except Exception:
-                import traceback
-                print("ERROR OCCURED IN %s JOB: %s (APP: %s)" % (when.upper(), job_name, app_name))
-                print("START TRACEBACK:")
-                traceback.print_exc()
-                print("END TRACEBACK\n")
+            executor.submit(job, app_name, job_name, when)
+        executor.wait()
+
+    def import_job_signal_modules(self, verbosity=1):
+        """
+        Imports the modules connecting receivers to the job signals.
+
+        An app can declare this module with the job_signals_module attribute
+        of its AppConfig, which may be None when it has no such receivers,
+        import errors of a declared module are raised. For other apps the
+        management package is imported, when it exists, unless the
+        RUNJOBS_IMPORT_MANAGEMENT_MODULES setting is False. As before
+        job_signals_module existed, import errors of these are ignored.
+        """
+        from django.conf import settings
+        from django.utils.module_loading import module_has_submodule
+
+        import_management = getattr(settings, 'RUNJOBS_IMPORT_MANAGEMENT_MODULES', True)
+        for app_config in apps.get_app_configs():
+            if hasattr(app_config, 'job_signals_module'):
+                if app_config.job_signals_module:
+                    importlib.import_module(app_config.job_signals_module)
+            elif import_management and module_has_submodule(app_config.module, 'management'):
+                try:
+                    importlib.import_module(app_config.name + '.management')
+                except ImportError as e:
+                    if verbosity > 1:
+                        print("Failed to import %s.management: %s" % (app_config.name, e))
 
     def runjobs_by_signals(self, when, options):
         """ Run jobs from the signals """
         # Thanks for Ian Holsman for the idea and code
         from django_extensions.management import signals
-        from django.conf import settings
 
         verbosity = int(options.get('verbosity', 1))
-        for app_name in settings.INSTALLED_APPS:
-            try:
-                __import__(app_name + '.management', '', '', [''])
-            except ImportError:
-                pass
+        self.import_job_signal_modules(verbosity)
 
+        signal = signals.JOB_SIGNALS[when]
         for app in (app.models_module for app in apps.get_app_configs() if app.models_module):
+            if not signal.has_listeners(app):
+                continue
             if verbosity > 1:
                 app_name = '.'.join(app.__name__.rsplit('.')[:-1])
                 print("Sending %s job signal for: %s" % (when, app_name))
-            if when == 'minutely':
-                signals.run_minutely_jobs.send(sender=app, app=app)
-            elif when == 'quarter_hourly':
-                signals.run_quarter_hourly_jobs.send(sender=app, app=app)
-            elif when == 'hourly':
-                signals.run_hourly_jobs.send(sender=app, app=app)
-            elif when == 'daily':
-                signals.run_daily_jobs.send(sender=app, app=app)
-            elif when == 'weekly':
-                signals.run_weekly_jobs.send(sender=app, app=app)
-            elif when == 'monthly':
-                signals.run_monthly_jobs.send(sender=app, app=app)
-            elif when == 'yearly':
-                signals.run_yearly_jobs.send(sender=app, app=app)
+            signal.send(sender=app, app=app)
 
     @signalcommand
     def handle(self, *args, **options):
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from django.core.management.base import BaseCommand, CommandError
+
+from django_extensions.management.job_executors import get_executor
+from django_extensions.management.jobs import JobError
+from django_extensions.management.utils import signalcommand
+
+
+class Command(BaseCommand):
+    help = "Runs the jobs queued by runjobs."
+
+    def add_arguments(self, parser):
+        super(Command, self).add_arguments(parser)
+        parser.add_argument(
+            '--executor', '-e', dest='executor',
+            help="Executor whose queue is consumed: database or the dotted path to an executor "
+                 "class. Defaults to settings.RUNJOBS_EXECUTOR.")
+        parser.add_argument(
+            '--burst', '-b', action='store_true', dest='burst', default=False,
+            help="Exit once the queue is empty instead of waiting for new jobs")
+        parser.add_argument(
+            '--sleep', '-s', type=float, dest='sleep', default=1,
+            help="Number of seconds to wait before polling an empty queue again")
+        parser.add_argument(
+            '--create-table', action='store_true', dest='create_table', default=False,
+            help="Create the queue table of the executor and exit")
+
+    @signalcommand
+    def handle(self, *args, **options):
+        verbosity = int(options.get('verbosity', 1))
+        try:
+            executor = get_executor(options.get('executor'), verbosity=verbosity)
+            if options.get('create_table'):
+                created = executor.create_table()
+                if verbosity > 0:
+                    print("Created the queue table." if created else "The queue table already exists.")
+                return
+            executor.work(burst=options.get('burst'), sleep=options.get('sleep'))
+        except JobError as err:
+            raise CommandError(str(err))
@@ -22,14 +22,17 @@ KNOWN ISSUES:
 """
 
 import importlib
+import json
+import re
 import sys
+import threading
 
 import six
 from django.apps import apps
 from django.core.management import BaseCommand, CommandError, sql as _sql
 from django.core.management.base import OutputWrapper
 from django.core.management.color import no_style
-from django.db import connection, transaction
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
 from django.db.models.fields import AutoField, IntegerField
 
 from django_extensions.management.utils import signalcommand
@@ -53,11 +56,20 @@ def flatten(l, ltypes=(list, tuple)):
     return ltype(l)
 
 
-def all_local_fields(meta):
+def format_size(size):
+    if size < 1024:
+        return "%d bytes" % size
+    for unit in ('kB', 'MB', 'GB', 'TB'):
+        size /= 1024.0
+        if size < 1024 or unit == 'TB':
+            return "%.1f %s" % (size, unit)
+
+
+def all_local_fields(meta, connection):
     all_fields = []
     if meta.proxy:
         for parent in meta.parents:
-            all_fields.extend(all_local_fields(parent._meta))
+            all_fields.extend(all_local_fields(parent._meta, connection))
     else:
         for f in meta.local_fields:
             col_type = f.db_type(connection=connection)
@@ -67,6 +79,21 @@ def all_local_fields(meta):
     return all_fields
 
 
+class ModelSnapshot(object):
+    """
+    The model side information sqldiff compares, computed once per model.
+    """
+
+    def __init__(self, meta, connection):
+        self.local_fields = all_local_fields(meta, connection)
+        # by database column
+        self.fieldmap = dict((field.db_column or field.get_attname(), field) for field in self.local_fields)
+        # by field name
+        self.fields = dict((field.name, field) for field in self.local_fields)
+        self.unique = dict((field.db_column or field.name, field.unique) for field in self.local_fields)
+        self.unique_together = flatten(meta.unique_together)
+
+
 class SQLDiff(object):
     DATA_TYPES_REVERSE_OVERRIDE = {}
 
@@ -108,10 +135,17 @@ class SQLDiff(object):
         'field-parameter-differ': "field '%(1)s' parameters differ: db='%(3)s', model='%(2)s'",
         'notnull-differ': "field '%(1)s' null constraint should be '%(2)s' in the database",
     }
+    ADVISORY_TEXTS = {
+        'table-size': "table '%(0)s' holds about %(1)s rows in %(3)s",
+        'fkey-index-missing': "field '%(1)s' FOREIGN KEY has no index starting with it",
+        'ordering-index-missing': "field '%(1)s' used by Meta.%(2)s has no index starting with it",
+        'index-redundant': "index '%(1)s' is redundant, its columns are a prefix of index '%(2)s'",
+        'index-duplicate': "index '%(1)s' is a duplicate of index '%(2)s'",
+    }
 
     SQL_FIELD_MISSING_IN_DB = lambda self, style, qn, args: "%s %s\n\t%s %s %s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD('ADD COLUMN'), style.SQL_FIELD(qn(args[1])), ' '.join(style.SQL_COLTYPE(a) if i == 0 else style.SQL_KEYWORD(a) for i, a in enumerate(args[2:])))
     SQL_FIELD_MISSING_IN_MODEL = lambda self, style, qn, args: "%s %s\n\t%s %s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD('DROP COLUMN'), style.SQL_FIELD(qn(args[1])))
-    SQL_FKEY_MISSING_IN_DB = lambda self, style, qn, args: "%s %s\n\t%s %s %s %s %s (%s)%s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD('ADD COLUMN'), style.SQL_FIELD(qn(args[1])), ' '.join(style.SQL_COLTYPE(a) if i == 0 else style.SQL_KEYWORD(a) for i, a in enumerate(args[4:])), style.SQL_KEYWORD('REFERENCES'), style.SQL_TABLE(qn(args[2])), style.SQL_FIELD(qn(args[3])), connection.ops.deferrable_sql())
+    SQL_FKEY_MISSING_IN_DB = lambda self, style, qn, args: "%s %s\n\t%s %s %s %s %s (%s)%s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD('ADD COLUMN'), style.SQL_FIELD(qn(args[1])), ' '.join(style.SQL_COLTYPE(a) if i == 0 else style.SQL_KEYWORD(a) for i, a in enumerate(args[4:])), style.SQL_KEYWORD('REFERENCES'), style.SQL_TABLE(qn(args[2])), style.SQL_FIELD(qn(args[3])), self.connection.ops.deferrable_sql())
     SQL_INDEX_MISSING_IN_DB = lambda self, style, qn, args: "%s %s\n\t%s %s (%s%s);" % (style.SQL_KEYWORD('CREATE INDEX'), style.SQL_TABLE(qn("%s" % '_'.join(a for a in args[0:3] if a))), style.SQL_KEYWORD('ON'), style.SQL_TABLE(qn(args[0])), style.SQL_FIELD(qn(args[1])), style.SQL_KEYWORD(args[3]))
     # FIXME: need to lookup index name instead of just appending _idx to table + fieldname
     SQL_INDEX_MISSING_IN_MODEL = lambda self, style, qn, args: "%s %s;" % (style.SQL_KEYWORD('DROP INDEX'), style.SQL_TABLE(qn("%s" % '_'.join(a for a in args[0:3] if a))))
@@ -121,6 +155,8 @@ class SQLDiff(object):
     SQL_FIELD_TYPE_DIFFER = lambda self, style, qn, args: "%s %s\n\t%s %s %s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD("MODIFY"), style.SQL_FIELD(qn(args[1])), style.SQL_COLTYPE(args[2]))
     SQL_FIELD_PARAMETER_DIFFER = lambda self, style, qn, args: "%s %s\n\t%s %s %s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD("MODIFY"), style.SQL_FIELD(qn(args[1])), style.SQL_COLTYPE(args[2]))
     SQL_NOTNULL_DIFFER = lambda self, style, qn, args: "%s %s\n\t%s %s %s %s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD('MODIFY'), style.SQL_FIELD(qn(args[1])), style.SQL_KEYWORD(args[2]), style.SQL_KEYWORD('NOT NULL'))
+    SQL_INDEX_MISSING_IN_DB_CONCURRENTLY = None
+    SQL_INDEX_MISSING_IN_MODEL_CONCURRENTLY = None
     SQL_ERROR = lambda self, style, qn, args: style.NOTICE('-- Error: %s' % style.ERROR(args[0]))
     SQL_COMMENT = lambda self, style, qn, args: style.NOTICE('-- Comment: %s' % style.SQL_TABLE(args[0]))
     SQL_TABLE_MISSING_IN_DB = lambda self, style, qn, args: style.NOTICE('-- Table missing: %s' % args[0])
@@ -129,28 +165,48 @@ class SQLDiff(object):
     can_detect_notnull_differ = False
     can_detect_unsigned_differ = False
     unsigned_suffix = None
-
-    def __init__(self, app_models, options):
+    # combine the ALTER TABLE statements for a table into a single statement
+    can_group_alter_table = False
+    can_create_index_concurrently = False
+    # differences whose SQL must run before or after the transaction
+    pre_transaction_diffs = ()
+    post_transaction_diffs = ()
+
+    def __init__(self, app_models, options, using=DEFAULT_DB_ALIAS, schema=None, snapshot=None, connection=None):
         self.has_differences = None
         self.app_models = app_models
         self.options = options
         self.dense = options.get('dense_output', False)
+        self.connection = connection or connections[using]
+        self.schema = schema or "public"
+
+        if options.get('concurrently') and not self.can_create_index_concurrently:
+            raise CommandError("Database backend %s can not create indexes concurrently" % self.connection.vendor)
 
         try:
-            self.introspection = connection.introspection
+            self.introspection = self.connection.introspection
         except AttributeError:
             from django.db import get_introspection_module
             self.introspection = get_introspection_module()
 
-        self.cursor = connection.cursor()
-        self.django_tables = self.get_django_tables(options.get('only_existing', True))
-        # TODO: We are losing information about tables which are views here
-        self.db_tables = [table_info.name for table_info in self.introspection.get_table_list(self.cursor)]
         self.differences = []
+        self.advisories = []
+        self.table_sizes = None
         self.unknown_db_fields = {}
         self.new_db_fields = set()
         self.null = {}
         self.unsigned = set()
+        self.type_lookups = {}
+        # model side computations cached for the run
+        self.model_snapshots = {}
+        self.field_model_types = {}
+        self.field_types = {}
+        self.reverse_db_types = {}
+        self.description_maps = {}
+        # per table introspection results loaded in bulk by load_catalog
+        self.table_descriptions = {}
+        self.table_indexes = {}
+        self.table_constraints = {}
 
         self.DIFF_SQL = {
             'error': self.SQL_ERROR,
@@ -170,12 +226,116 @@ class SQLDiff(object):
             'notnull-differ': self.SQL_NOTNULL_DIFFER,
         }
 
+        if snapshot is not None:
+            # compare with a saved schema instead of a live database
+            self.cursor = None
+            self.restore_snapshot(snapshot)
+            only_existing = options.get('only_existing', True)
+            self.django_tables = [table for table in self.get_django_tables(False) if not only_existing or table in self.db_tables]
+            return
+
+        self.cursor = self.connection.cursor()
+        if schema:
+            self.set_schema(schema)
+        self.django_tables = self.get_django_tables(options.get('only_existing', True))
+        # TODO: We are losing information about tables which are views here
+        self.db_tables = [table_info.name for table_info in self.introspection.get_table_list(self.cursor)]
+
         if self.can_detect_notnull_differ:
             self.load_null()
 
         if self.can_detect_unsigned_differ:
             self.load_unsigned()
 
+        self.load_catalog()
+
+    def set_schema(self, schema):
+        """
+        Makes the connection introspect the given schema.
+        """
+        raise CommandError("Database backend %s does not support schemas" % self.connection.vendor)
+
+    def load_catalog(self):
+        """
+        Loads the descriptions, indexes and constraints of all tables at once.
+
+        Backends which can read these from the database catalog in a few
+        queries fill table_descriptions, table_indexes and table_constraints
+        here. Tables missing from these are introspected one by one.
+        """
+        pass
+
+    def get_table_description(self, table_name):
+        if table_name in self.table_descriptions:
+            return self.table_descriptions[table_name]
+        return self.introspection.get_table_description(self.cursor, table_name)
+
+    def get_table_indexes(self, table_name):
+        if table_name in self.table_indexes:
+            return self.table_indexes[table_name]
+        return self.introspection.get_indexes(self.cursor, table_name)
+
+    def get_table_constraints(self, table_name):
+        if table_name in self.table_constraints:
+            return self.table_constraints[table_name]
+        if hasattr(self.introspection, 'get_constraints'):
+            return self.introspection.get_constraints(self.cursor, table_name)
+        return self.get_constraints(self.cursor, table_name, self.introspection)
+
+    def make_field_info(self, values):
+        # the backend extends FieldInfo with the default since Django 1.9
+        field_info = importlib.import_module(self.introspection.__module__).FieldInfo
+        return field_info(*list(values)[:len(field_info._fields)])
+
+    def get_snapshot(self):
+        """
+        Returns the introspected schema as a JSON serializable dict from which
+        an SQLDiff can be restored without a database connection.
+        """
+        tables = {}
+        for table_name in self.db_tables:
+            description = self.get_table_description(table_name)
+            for row in description:
+                type_code = row[1]
+                if type_code in self.DATA_TYPES_REVERSE_OVERRIDE:
+                    continue
+                try:
+                    self.introspection.data_types_reverse[type_code]
+                except KeyError:
+                    self.lookup_field_db_type(type_code)
+            tables[table_name] = {
+                'description': [list(row) for row in description],
+                'indexes': self.get_table_indexes(table_name),
+                'constraints': self.get_table_constraints(table_name),
+            }
+        return {
+            'version': 1,
+            'engine': self.connection.settings_dict['ENGINE'],
+            'schema': self.schema,
+            'tables': tables,
+            'db_tables': self.db_tables,
+            'null': [list(key) + [value] for key, value in six.iteritems(self.null) if key[1] in tables],
+            'unsigned': [list(key) for key in self.unsigned],
+            'type_lookups': [[key, value] for key, value in six.iteritems(self.type_lookups)],
+            'table_sizes': [[key] + list(value) for key, value in six.iteritems(self.get_table_sizes()) if key in tables],
+        }
+
+    def restore_snapshot(self, snapshot):
+        self.schema = snapshot['schema']
+        self.db_tables = snapshot['db_tables']
+        for table_name, table in six.iteritems(snapshot['tables']):
+            self.table_descriptions[table_name] = [self.make_field_info(row) for row in table['description']]
+            self.table_indexes[table_name] = table['indexes']
+            constraints = table['constraints']
+            for constraint in constraints.values():
+                if constraint.get('foreign_key'):
+                    constraint['foreign_key'] = tuple(constraint['foreign_key'])
+            self.table_constraints[table_name] = constraints
+        self.null = dict((tuple(row[:3]), row[3]) for row in snapshot['null'])
+        self.unsigned = set(tuple(row) for row in snapshot['unsigned'])
+        self.type_lookups = dict((key, value) for key, value in snapshot['type_lookups'])
+        self.table_sizes = dict((row[0], tuple(row[1:])) for row in snapshot.get('table_sizes', []))
+
     def load_null(self):
         raise NotImplementedError("load_null functions must be implemented if diff backend has 'can_detect_notnull_differ' set to True")
 
@@ -185,6 +345,18 @@ class SQLDiff(object):
     def add_app_model_marker(self, app_label, model_name):
         self.differences.append((app_label, model_name, []))
 
+    def load_table_sizes(self):
+        """
+        Returns the estimated number of rows and size in bytes of the tables
+        as far as the database catalog keeps statistics about them.
+        """
+        return {}
+
+    def get_table_sizes(self):
+        if self.table_sizes is None:
+            self.table_sizes = self.load_table_sizes()
+        return self.table_sizes
+
     def add_difference(self, diff_type, *args):
         assert diff_type in self.DIFF_TYPES, 'Unknown difference type'
         self.differences[-1][-1].append((diff_type, args))
@@ -206,7 +378,7 @@ class SQLDiff(object):
 
         code from snippet at http://www.djangosnippets.org/snippets/1383/
         """
-        cursor = connection.cursor()
+        cursor = self.connection.cursor()
         cursor.execute(query, param)
         fieldnames = [name[0] for name in cursor.description]
         result = []
@@ -217,11 +389,49 @@ class SQLDiff(object):
             result.append(dict(rowset))
         return result
 
+    def get_model_snapshot(self, meta):
+        key = (meta.app_label, meta.model_name)
+        if key not in self.model_snapshots:
+            self.model_snapshots[key] = ModelSnapshot(meta, self.connection)
+        return self.model_snapshots[key]
+
+    def get_description_map(self, table_name, table_description):
+        if table_name not in self.description_maps:
+            self.description_maps[table_name] = dict((row[0], row) for row in table_description)
+        return self.description_maps[table_name]
+
     def get_field_model_type(self, field):
-        return field.db_type(connection=connection)
+        key = id(field)
+        if key not in self.field_model_types:
+            self.field_model_types[key] = field.db_type(connection=self.connection)
+        return self.field_model_types[key]
+
+    def get_field_types(self, field, description, table_name):
+        """
+        Returns the model and database type of a field.
+        """
+        key = (table_name, id(field))
+        if key not in self.field_types:
+            self.field_types[key] = (self.get_field_model_type(field), self.get_field_db_type(description, field, table_name))
+        return self.field_types[key]
+
+    def get_reverse_db_type(self, reverse_type, kwargs):
+        """
+        Returns the database type of the field class named reverse_type
+        instantiated with kwargs.
+        """
+        key = (reverse_type, tuple(sorted(kwargs.items())))
+        if key not in self.reverse_db_types:
+            if '.' in reverse_type:
+                module_path, package_name = reverse_type.rsplit('.', 1)
+                field_class = getattr(importlib.import_module(module_path), package_name)
+            else:
+                from django.db import models
+                field_class = getattr(models, reverse_type)
+            self.reverse_db_types[key] = field_class(**kwargs).db_type(connection=self.connection)
+        return self.reverse_db_types[key]
 
     def get_field_db_type(self, description, field=None, table_name=None):
-        from django.db import models
         # DB-API cursor.description
         # (name, type_code, display_size, internal_size, precision, scale, null_ok) = description
         type_code = description[1]
@@ -235,7 +445,7 @@ class SQLDiff(object):
                     # backwards compatibility for before introspection refactoring (r8296)
                     reverse_type = self.introspection.DATA_TYPES_REVERSE.get(type_code)
             except KeyError:
-                reverse_type = self.get_field_db_type_lookup(type_code)
+                reverse_type = self.lookup_field_db_type(type_code)
                 if not reverse_type:
                     # type_code not found in data_types_reverse map
                     key = (self.differences[-1][:2], description[:2])
@@ -267,28 +477,28 @@ class SQLDiff(object):
         if field and getattr(field, 'geography', False):
             kwargs['geography'] = True
 
-        if '.' in reverse_type:
-            module_path, package_name = reverse_type.rsplit('.', 1)
-            module = importlib.import_module(module_path)
-            field_db_type = getattr(module, package_name)(**kwargs).db_type(connection=connection)
-        else:
-            field_db_type = getattr(models, reverse_type)(**kwargs).db_type(connection=connection)
+        field_db_type = self.get_reverse_db_type(reverse_type, kwargs)
 
         tablespace = field.db_tablespace
         if not tablespace:
-            tablespace = "public"
+            tablespace = self.schema
         if (tablespace, table_name, field.column) in self.unsigned:
             field_db_type = '%s %s' % (field_db_type, self.unsigned_suffix)
 
         return field_db_type
 
+    def lookup_field_db_type(self, type_code):
+        if type_code not in self.type_lookups:
+            self.type_lookups[type_code] = self.get_field_db_type_lookup(type_code)
+        return self.type_lookups[type_code]
+
     def get_field_db_type_lookup(self, type_code):
         return None
 
     def get_field_db_nullable(self, field, table_name):
         tablespace = field.db_tablespace
         if tablespace == "":
-            tablespace = "public"
+            tablespace = self.schema
         attname = field.db_column or field.attname
         return self.null.get((tablespace, table_name, attname), 'fixme')
 
@@ -298,7 +508,7 @@ class SQLDiff(object):
         return field_type
 
     def find_unique_missing_in_db(self, meta, table_indexes, table_constraints, table_name):
-        for field in all_local_fields(meta):
+        for field in self.get_model_snapshot(meta).local_fields:
             if field.unique and meta.managed:
                 attname = field.db_column or field.attname
                 db_field_unique = table_indexes.get(attname, {}).get('unique')
@@ -311,30 +521,32 @@ class SQLDiff(object):
     def find_unique_missing_in_model(self, meta, table_indexes, table_constraints, table_name):
         # TODO: Postgresql does not list unique_togethers in table_indexes
         #       MySQL does
-        fields = dict([(field.db_column or field.name, field.unique) for field in all_local_fields(meta)])
+        snapshot = self.get_model_snapshot(meta)
+        fields = snapshot.unique
         for att_name, att_opts in six.iteritems(table_indexes):
             db_field_unique = att_opts['unique']
             if not db_field_unique and table_constraints:
                 db_field_unique = any(constraint['unique'] for contraint_name, constraint in six.iteritems(table_constraints) if att_name in constraint['columns'])
             if db_field_unique and att_name in fields and not fields[att_name]:
-                if att_name in flatten(meta.unique_together):
+                if att_name in snapshot.unique_together:
                     continue
                 self.add_difference('unique-missing-in-model', table_name, att_name)
 
     def find_index_missing_in_db(self, meta, table_indexes, table_constraints, table_name):
-        for field in all_local_fields(meta):
+        for field in self.get_model_snapshot(meta).local_fields:
             if field.db_index:
                 attname = field.db_column or field.attname
                 if attname not in table_indexes:
                     self.add_difference('index-missing-in-db', table_name, attname, '', '')
-                    db_type = field.db_type(connection=connection)
+                    db_type = self.get_field_model_type(field)
                     if db_type.startswith('varchar'):
                         self.add_difference('index-missing-in-db', table_name, attname, 'like', ' varchar_pattern_ops')
                     if db_type.startswith('text'):
                         self.add_difference('index-missing-in-db', table_name, attname, 'like', ' text_pattern_ops')
 
     def find_index_missing_in_model(self, meta, table_indexes, table_constraints, table_name):
-        fields = dict([(field.name, field) for field in all_local_fields(meta)])
+        snapshot = self.get_model_snapshot(meta)
+        fields = snapshot.fields
         for att_name, att_opts in six.iteritems(table_indexes):
             if att_name in fields:
                 field = fields[att_name]
@@ -349,10 +561,10 @@ class SQLDiff(object):
                     continue
                 if db_field_unique and field.unique:
                     continue
-                if db_field_unique and att_name in flatten(meta.unique_together):
+                if db_field_unique and att_name in snapshot.unique_together:
                     continue
                 self.add_difference('index-missing-in-model', table_name, att_name)
-                db_type = field.db_type(connection=connection)
+                db_type = self.get_field_model_type(field)
                 if db_type.startswith('varchar') or db_type.startswith('text'):
                     self.add_difference('index-missing-in-model', table_name, att_name, 'like')
 
@@ -371,21 +583,20 @@ class SQLDiff(object):
                     op = 'fkey-missing-in-db'
                 else:
                     op = 'field-missing-in-db'
-                field_output.append(field.db_type(connection=connection))
+                field_output.append(self.get_field_model_type(field))
                 if not field.null:
                     field_output.append('NOT NULL')
                 self.add_difference(op, table_name, field_name, *field_output)
                 self.new_db_fields.add((table_name, field_name))
 
     def find_field_type_differ(self, meta, table_description, table_name, func=None):
-        db_fields = dict([(row[0], row) for row in table_description])
-        for field in all_local_fields(meta):
+        db_fields = self.get_description_map(table_name, table_description)
+        for field in self.get_model_snapshot(meta).local_fields:
             if field.name not in db_fields:
                 continue
             description = db_fields[field.name]
 
-            model_type = self.get_field_model_type(field)
-            db_type = self.get_field_db_type(description, field, table_name)
+            model_type, db_type = self.get_field_types(field, description, table_name)
 
             # use callback function if defined
             if func:
@@ -395,14 +606,13 @@ class SQLDiff(object):
                 self.add_difference('field-type-differ', table_name, field.name, model_type, db_type)
 
     def find_field_parameter_differ(self, meta, table_description, table_name, func=None):
-        db_fields = dict([(row[0], row) for row in table_description])
-        for field in all_local_fields(meta):
+        db_fields = self.get_description_map(table_name, table_description)
+        for field in self.get_model_snapshot(meta).local_fields:
             if field.name not in db_fields:
                 continue
             description = db_fields[field.name]
 
-            model_type = self.get_field_model_type(field)
-            db_type = self.get_field_db_type(description, field, table_name)
+            model_type, db_type = self.get_field_types(field, description, table_name)
 
             if not self.strip_parameters(model_type) == self.strip_parameters(db_type):
                 continue
@@ -411,7 +621,7 @@ class SQLDiff(object):
             if func:
                 model_type, db_type = func(field, description, model_type, db_type)
 
-            model_check = field.db_parameters(connection=connection)['check']
+            model_check = field.db_parameters(connection=self.connection)['check']
             if ' CHECK' in db_type:
                 db_type, db_check = db_type.split(" CHECK", 1)
                 db_check = db_check.strip().lstrip("(").rstrip(")")
@@ -424,7 +634,7 @@ class SQLDiff(object):
         if not self.can_detect_notnull_differ:
             return
 
-        for field in all_local_fields(meta):
+        for field in self.get_model_snapshot(meta).local_fields:
             attname = field.db_column or field.attname
             if (table_name, attname) in self.new_db_fields:
                 continue
@@ -436,6 +646,203 @@ class SQLDiff(object):
     def get_constraints(self, cursor, table_name, introspection):
         return {}
 
+    def get_migration_field(self, model, column):
+        if model is None:
+            return None
+        for field in self.get_model_snapshot(model._meta).local_fields:
+            if column in (field.column, field.name):
+                return field
+        return None
+
+    def get_reverse_difference(self, diff_type, diff_args, field):
+        """
+        Returns the difference undoing a difference, or None when it can not
+        be undone, as for dropped columns.
+        """
+        if diff_type in ('field-missing-in-db', 'fkey-missing-in-db'):
+            return 'field-missing-in-model', diff_args[:2]
+        if diff_type == 'index-missing-in-db':
+            return 'index-missing-in-model', diff_args[:3]
+        if diff_type == 'index-missing-in-model':
+            suffix = diff_args[2] if len(diff_args) > 2 else ''
+            opclass = ''
+            if suffix == 'like' and field is not None:
+                db_type = self.get_field_model_type(field)
+                if db_type.startswith('varchar'):
+                    opclass = ' varchar_pattern_ops'
+                elif db_type.startswith('text'):
+                    opclass = ' text_pattern_ops'
+            return 'index-missing-in-db', (diff_args[0], diff_args[1], suffix, opclass)
+        if diff_type == 'unique-missing-in-db':
+            return 'unique-missing-in-model', diff_args
+        if diff_type == 'unique-missing-in-model':
+            return 'unique-missing-in-db', diff_args
+        if diff_type in ('field-type-differ', 'field-parameter-differ'):
+            return diff_type, (diff_args[0], diff_args[1], diff_args[3], diff_args[2])
+        if diff_type == 'notnull-differ':
+            return diff_type, (diff_args[0], diff_args[1], 'DROP' if diff_args[2] == 'SET' else 'SET')
+        return None
+
+    def get_migration(self, app_label):
+        """
+        Returns a migration bringing the database in line with the models of
+        app_label, and the differences which it does not cover.
+
+        The migration state already matches the models, so for managed models
+        the state is first set to what is in the database, after which AddField
+        and AlterField operations change the database. Other differences use
+        RunSQL operations with the SQL undoing them as reverse_sql. Indexes are
+        created and dropped concurrently where the backend supports it, which
+        makes the migration non-atomic.
+        """
+        from django.db import migrations
+        from django.db.migrations.autodetector import MigrationAutodetector
+        from django.db.migrations.loader import MigrationLoader
+
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        leaf_nodes = loader.graph.leaf_nodes(app_label)
+        if not leaf_nodes:
+            raise CommandError("App '%s' does not have migrations" % app_label)
+        if len(leaf_nodes) > 1:
+            raise CommandError("Conflicting migrations detected in app '%s', run makemigrations --merge first" % app_label)
+        state = loader.project_state()
+
+        sql_functions = dict(self.DIFF_SQL)
+        if self.can_create_index_concurrently:
+            sql_functions['index-missing-in-db'] = self.SQL_INDEX_MISSING_IN_DB_CONCURRENTLY
+            sql_functions['index-missing-in-model'] = self.SQL_INDEX_MISSING_IN_MODEL_CONCURRENTLY
+        qn = self.connection.ops.quote_name
+        style = no_style()
+
+        app_models = dict(((model._meta.app_label, model.__name__), model) for model in self.app_models)
+        operations, skipped = [], []
+        dependencies = set(leaf_nodes)
+        atomic = True
+        for model_app_label, model_name, diffs in self.differences:
+            if model_app_label != app_label:
+                continue
+            model = app_models.get((model_app_label, model_name))
+            migrated = model is not None and (app_label, model._meta.model_name) in state.models
+            for diff_type, diff_args in diffs:
+                field = self.get_migration_field(model, diff_args[1]) if len(diff_args) > 1 else None
+                if migrated and field and diff_type in ('field-missing-in-db', 'fkey-missing-in-db'):
+                    operations.append(migrations.SeparateDatabaseAndState(state_operations=[
+                        migrations.RemoveField(model._meta.model_name, field.name),
+                    ]))
+                    operations.append(migrations.AddField(model._meta.model_name, field.name, field.clone()))
+                    if field.rel:
+                        related_app_label = field.rel.to._meta.app_label
+                        if related_app_label != app_label:
+                            dependencies.update(loader.graph.leaf_nodes(related_app_label))
+                elif migrated and field and diff_type == 'notnull-differ':
+                    db_field = field.clone()
+                    db_field.null = not field.null
+                    operations.append(migrations.SeparateDatabaseAndState(state_operations=[
+                        migrations.AlterField(model._meta.model_name, field.name, db_field),
+                    ]))
+                    operations.append(migrations.AlterField(model._meta.model_name, field.name, field.clone()))
+                else:
+                    reverse = self.get_reverse_difference(diff_type, diff_args, field)
+                    if reverse is None:
+                        skipped.append((diff_type, diff_args))
+                        continue
+                    reverse_type, reverse_args = reverse
+                    operations.append(migrations.RunSQL(
+                        sql_functions[diff_type](style, qn, diff_args),
+                        reverse_sql=sql_functions[reverse_type](style, qn, reverse_args),
+                    ))
+                    if self.can_create_index_concurrently and diff_type in ('index-missing-in-db', 'index-missing-in-model'):
+                        atomic = False
+
+        number = MigrationAutodetector.parse_number(leaf_nodes[0][1]) or 0
+        migration = migrations.Migration("%04i_sqldiff" % (number + 1), app_label)
+        migration.dependencies = sorted(dependencies)
+        migration.operations = operations
+        migration.atomic = atomic
+        return migration, skipped
+
+    def get_index_columns(self, table_name):
+        """
+        Returns (name, columns, unique) for the indexes of a table which can
+        be used to look up rows by their leading columns.
+        """
+        indexes = []
+        for name, constraint in sorted(six.iteritems(self.get_table_constraints(table_name))):
+            columns = tuple(constraint['columns'] or ())
+            # skip expression indexes
+            if not columns or None in columns:
+                continue
+            unique = bool(constraint['unique'] or constraint['primary_key'])
+            if constraint['index'] or unique:
+                indexes.append((name, columns, unique))
+        return indexes
+
+    def get_ordering_column(self, meta, names):
+        if isinstance(names, six.string_types):
+            names = [names]
+        if not names or not isinstance(names[0], six.string_types):
+            return None
+        name = names[0].lstrip('-')
+        if name == 'pk':
+            return meta.pk.column
+        for field in self.get_model_snapshot(meta).local_fields:
+            if name in (field.name, field.attname):
+                return field.column
+        return None
+
+    def find_performance_issues(self):
+        """
+        Advisory pass looking for missing, redundant and duplicate indexes.
+        The advisories are reported along with the size of the table but do
+        not count as differences.
+        """
+        missing_indexes = set()
+        for app_label, model_name, diffs in self.differences:
+            for diff_type, diff_args in diffs:
+                if diff_type == 'index-missing-in-db':
+                    missing_indexes.add(tuple(diff_args[:2]))
+
+        table_sizes = self.get_table_sizes()
+        for app_model in self.app_models:
+            meta = app_model._meta
+            table_name = meta.db_table
+            if table_name not in self.db_tables:
+                continue
+
+            advisories = []
+            indexes = self.get_index_columns(table_name)
+            # columns already indexed or reported as index-missing-in-db
+            covered = set(columns[0] for name, columns, unique in indexes)
+            covered.update(column for table, column in missing_indexes if table == table_name)
+
+            for field in self.get_model_snapshot(meta).local_fields:
+                if getattr(field, 'many_to_one', False) and field.column not in covered:
+                    advisories.append(('fkey-index-missing', (table_name, field.column)))
+                    covered.add(field.column)
+
+            for option in ('ordering', 'get_latest_by'):
+                column = self.get_ordering_column(meta, getattr(meta, option))
+                if column and column not in covered:
+                    advisories.append(('ordering-index-missing', (table_name, column, option)))
+                    covered.add(column)
+
+            for name, columns, unique in indexes:
+                for other_name, other_columns, other_unique in indexes:
+                    if other_name == name or unique and not other_unique:
+                        continue
+                    if columns == other_columns and (other_unique and not unique or other_name < name):
+                        advisories.append(('index-duplicate', (table_name, name, other_name)))
+                        break
+                    if not unique and len(columns) < len(other_columns) and other_columns[:len(columns)] == columns:
+                        advisories.append(('index-redundant', (table_name, name, other_name)))
+                        break
+
+            if advisories:
+                rows, size = table_sizes.get(table_name, (None, None))
+                if rows is not None:
+                    advisories.insert(0, ('table-size', (table_name, rows, size, format_size(size))))
+                self.advisories.append([meta.app_label, app_model.__name__, advisories])
+
     def find_differences(self):
         if self.options['all_applications']:
             self.add_app_model_marker(None, None)
@@ -458,23 +865,20 @@ class SQLDiff(object):
                 self.add_difference('table-missing-in-db', table_name)
                 continue
 
-            table_indexes = self.introspection.get_indexes(self.cursor, table_name)
-            if hasattr(self.introspection, 'get_constraints'):
-                table_constraints = self.introspection.get_constraints(self.cursor, table_name)
-            else:
-                table_constraints = self.get_constraints(self.cursor, table_name, self.introspection)
+            table_indexes = self.get_table_indexes(table_name)
+            table_constraints = self.get_table_constraints(table_name)
 
-            fieldmap = dict([(field.db_column or field.get_attname(), field) for field in all_local_fields(meta)])
+            fieldmap = dict(self.get_model_snapshot(meta).fieldmap)
 
             # add ordering field if model uses order_with_respect_to
             if meta.order_with_respect_to:
                 fieldmap['_order'] = ORDERING_FIELD
 
             try:
-                table_description = self.introspection.get_table_description(self.cursor, table_name)
+                table_description = self.get_table_description(table_name)
             except Exception as e:
                 self.add_difference('error', 'unable to introspect table: %s' % str(e).strip())
-                transaction.rollback()  # reset transaction
+                transaction.rollback(using=self.connection.alias)  # reset transaction
                 continue
 
             # Fields which are defined in database but not in model
@@ -502,12 +906,43 @@ class SQLDiff(object):
             self.find_field_notnull_differ(meta, table_description, table_name)
         self.has_differences = max([len(diffs) for _app_label, _model_name, diffs in self.differences])
 
+        if self.options.get('performance'):
+            self.find_performance_issues()
+
     def print_diff(self, style=no_style()):
         """ print differences to stdout """
-        if self.options.get('sql', True):
+        output = self.options.get('output')
+        if not output:
+            output = 'sql' if self.options.get('sql', True) else 'text'
+        if output == 'json':
+            self.print_diff_json(style)
+        elif output == 'sql':
             self.print_diff_sql(style)
+            self.print_advisories_sql(style)
         else:
             self.print_diff_text(style)
+            self.print_differences_text(style, self.advisories, self.ADVISORY_TEXTS, "Performance advisories for model:")
+
+    def get_diff_data(self):
+        """ differences as a JSON serializable list """
+        advisories = dict(((app_label, model_name), diffs) for app_label, model_name, diffs in self.advisories)
+        data = []
+        for app_label, model_name, diffs in self.differences:
+            model_advisories = advisories.get((app_label, model_name))
+            if not diffs and not model_advisories:
+                continue
+            model_data = {
+                'app_label': app_label,
+                'model': model_name,
+                'differences': [{'type': diff_type, 'args': list(diff_args)} for diff_type, diff_args in diffs],
+            }
+            if model_advisories:
+                model_data['advisories'] = [{'type': diff_type, 'args': list(diff_args)} for diff_type, diff_args in model_advisories]
+            data.append(model_data)
+        return data
+
+    def print_diff_json(self, style):
+        print(json.dumps(self.get_diff_data(), indent=None if self.dense else 4, default=str))
 
     def print_diff_text(self, style):
         if not self.can_detect_notnull_differ:
@@ -518,18 +953,21 @@ class SQLDiff(object):
             print(style.NOTICE("# Detecting unsigned changes not implemented for this database backend"))
             print("")
 
+        self.print_differences_text(style, self.differences, self.DIFF_TEXTS, "Differences for model:")
+
+    def print_differences_text(self, style, differences, texts, title):
         cur_app_label = None
-        for app_label, model_name, diffs in self.differences:
+        for app_label, model_name, diffs in differences:
             if not diffs:
                 continue
             if not self.dense and app_label and cur_app_label != app_label:
                 print("%s %s" % (style.NOTICE("+ Application:"), style.SQL_TABLE(app_label)))
                 cur_app_label = app_label
             if not self.dense and model_name:
-                print("%s %s" % (style.NOTICE("|-+ Differences for model:"), style.SQL_TABLE(model_name)))
+                print("%s %s" % (style.NOTICE("|-+ %s" % title), style.SQL_TABLE(model_name)))
             for diff in diffs:
                 diff_type, diff_args = diff
-                text = self.DIFF_TEXTS[diff_type] % dict((str(i), style.SQL_TABLE(e)) for i, e in enumerate(diff_args))
+                text = texts[diff_type] % dict((str(i), style.SQL_TABLE(e)) for i, e in enumerate(diff_args))
                 text = "'".join(i % 2 == 0 and style.ERROR(e) or e for i, e in enumerate(text.split("'")))
                 if not self.dense:
                     print("%s %s" % (style.NOTICE("|--+"), text))
@@ -545,27 +983,103 @@ class SQLDiff(object):
             print("")
 
         cur_app_label = None
-        qn = connection.ops.quote_name
+        qn = self.connection.ops.quote_name
         if not self.has_differences:
             if not self.dense:
                 print(style.SQL_KEYWORD("-- No differences"))
         else:
-            print(style.SQL_KEYWORD("BEGIN;"))
+            pre_transaction, blocks, post_transaction = [], [], []
             for app_label, model_name, diffs in self.differences:
                 if not diffs:
                     continue
+                before, statements, after = self.get_sql_statements(style, qn, diffs)
+                pre_transaction.extend(before)
+                blocks.append((app_label, model_name, statements))
+                post_transaction.extend(after)
+
+            if pre_transaction:
+                if not self.dense:
+                    print(style.NOTICE("-- Statements which can not run inside a transaction"))
+                self.print_sql_statements(pre_transaction)
+            print(style.SQL_KEYWORD("BEGIN;"))
+            for app_label, model_name, statements in blocks:
                 if not self.dense and cur_app_label != app_label:
                     print(style.NOTICE("-- Application: %s" % style.SQL_TABLE(app_label)))
                     cur_app_label = app_label
                 if not self.dense and model_name:
                     print(style.NOTICE("-- Model: %s" % style.SQL_TABLE(model_name)))
-                for diff in diffs:
-                    diff_type, diff_args = diff
-                    text = self.DIFF_SQL[diff_type](style, qn, diff_args)
-                    if self.dense:
-                        text = text.replace("\n\t", " ")
-                    print(text)
+                self.print_sql_statements(statements)
             print(style.SQL_KEYWORD("COMMIT;"))
+            if post_transaction:
+                if not self.dense:
+                    print(style.NOTICE("-- Statements which can not run inside a transaction"))
+                self.print_sql_statements(post_transaction)
+
+    def print_advisories_sql(self, style):
+        if not self.advisories:
+            return
+        if not self.dense:
+            print(style.NOTICE("-- Performance advisories"))
+        for app_label, model_name, advisories in self.advisories:
+            if not self.dense:
+                print(style.NOTICE("-- Model: %s.%s" % (app_label, model_name)))
+            for diff_type, diff_args in advisories:
+                text = self.ADVISORY_TEXTS[diff_type] % dict((str(i), e) for i, e in enumerate(diff_args))
+                print(style.NOTICE("-- %s" % text))
+
+    def print_sql_statements(self, statements):
+        for text in statements:
+            if self.dense:
+                text = text.replace("\n\t", " ")
+            print(text)
+
+    def get_sql_statements(self, style, qn, diffs):
+        """
+        Returns the SQL for a list of differences as three lists of statements,
+        to run before, inside and after the transaction.
+
+        When the backend can_group_alter_table, the ALTER TABLE statements of a
+        table are combined so the table is rewritten only once. Indexes dropped
+        for the table are dropped before that statement, new indexes are created
+        after it as they may be on columns it adds or alters.
+        """
+        before, statements, after = [], [], []
+        tables = {}
+        for diff_type, diff_args in diffs:
+            text = self.DIFF_SQL[diff_type](style, qn, diff_args)
+            if diff_type in self.pre_transaction_diffs:
+                before.append(text)
+            elif diff_type in self.post_transaction_diffs:
+                after.append(text)
+            elif not self.can_group_alter_table or diff_type in ('error', 'comment', 'table-missing-in-db', 'table-missing-in-model'):
+                statements.append(text)
+            else:
+                table_name = diff_args[0]
+                if table_name not in tables:
+                    prefix = "%s %s\n\t" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(table_name)))
+                    tables[table_name] = (prefix, [], [], [])
+                    statements.append(tables[table_name])
+                prefix, drops, clauses, creates = tables[table_name]
+                if text.startswith(prefix) and text.endswith(';'):
+                    clauses.append(text[len(prefix):-1])
+                elif diff_type.endswith('-missing-in-model'):
+                    drops.append(text)
+                else:
+                    creates.append(text)
+
+        if tables:
+            grouped = []
+            for statement in statements:
+                if not isinstance(statement, tuple):
+                    grouped.append(statement)
+                    continue
+                prefix, drops, clauses, creates = statement
+                grouped.extend(drops)
+                if clauses:
+                    grouped.append("%s%s;" % (prefix, ",\n\t".join(clauses)))
+                grouped.extend(creates)
+            statements = grouped
+        return before, statements, after
 
 
 class GenericSQLDiff(SQLDiff):
@@ -576,48 +1090,147 @@ class MySQLDiff(SQLDiff):
     can_detect_notnull_differ = True
     can_detect_unsigned_differ = True
     unsigned_suffix = 'UNSIGNED'
+    can_group_alter_table = True
 
-    def __init__(self, app_models, options):
-        super(MySQLDiff, self).__init__(app_models, options)
+    def __init__(self, app_models, options, using=DEFAULT_DB_ALIAS, schema=None, snapshot=None, connection=None):
         self.auto_increment = set()
-        self.load_auto_increment()
+        super(MySQLDiff, self).__init__(app_models, options, using, schema, snapshot, connection)
+        if snapshot is None:
+            self.load_auto_increment()
+
+    def get_snapshot(self):
+        snapshot = super(MySQLDiff, self).get_snapshot()
+        snapshot['auto_increment'] = [list(key) for key in self.auto_increment]
+        return snapshot
+
+    def restore_snapshot(self, snapshot):
+        super(MySQLDiff, self).restore_snapshot(snapshot)
+        self.auto_increment = set(tuple(row) for row in snapshot['auto_increment'])
 
     def load_null(self):
-        tablespace = 'public'
-        for table_name in self.db_tables:
-            result = self.sql_to_dict("""
-                SELECT column_name, is_nullable
-                FROM information_schema.columns
-                WHERE table_schema = DATABASE()
-                    AND table_name = %s""", [table_name])
-            for table_info in result:
-                key = (tablespace, table_name, table_info['column_name'])
-                self.null[key] = table_info['is_nullable'] == 'YES'
+        tablespace = self.schema
+        db_tables = set(self.db_tables)
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT table_name, column_name, is_nullable
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE()""")
+        for table_name, column_name, is_nullable in cursor.fetchall():
+            if table_name in db_tables:
+                self.null[(tablespace, table_name, column_name)] = is_nullable == 'YES'
 
     def load_unsigned(self):
-        tablespace = 'public'
-        for table_name in self.db_tables:
-            result = self.sql_to_dict("""
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_schema = DATABASE()
-                    AND table_name = %s
-                    AND column_type LIKE '%%unsigned'""", [table_name])
-            for table_info in result:
-                key = (tablespace, table_name, table_info['column_name'])
-                self.unsigned.add(key)
+        tablespace = self.schema
+        db_tables = set(self.db_tables)
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE()
+                AND column_type LIKE '%unsigned'""")
+        for table_name, column_name in cursor.fetchall():
+            if table_name in db_tables:
+                self.unsigned.add((tablespace, table_name, column_name))
+
+    def load_table_sizes(self):
+        table_sizes = {}
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT table_name, table_rows, data_length + index_length
+            FROM information_schema.tables
+            WHERE table_schema = DATABASE() AND table_rows IS NOT NULL""")
+        for table_name, rows, size in cursor.fetchall():
+            table_sizes[table_name] = (int(rows), int(size))
+        return table_sizes
 
     def load_auto_increment(self):
+        db_tables = set(self.db_tables)
+        cursor = self.connection.cursor()
+        cursor.execute("""
+            SELECT table_name, column_name
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE()
+               AND extra = 'auto_increment'""")
+        for table_name, column_name in cursor.fetchall():
+            if table_name in db_tables:
+                self.auto_increment.add((table_name, column_name))
+
+    def load_catalog(self):
+        cursor = self.connection.cursor()
+
+        # the layout of the constraints matches introspection.get_constraints()
+        cursor.execute("""
+            SELECT kc.table_name, kc.constraint_name, kc.column_name,
+                kc.referenced_table_name, kc.referenced_column_name
+            FROM information_schema.key_column_usage AS kc
+            WHERE kc.table_schema = DATABASE()
+            ORDER BY kc.table_name, kc.constraint_name, kc.ordinal_position""")
+        for table_name, constraint, column, ref_table, ref_column in cursor.fetchall():
+            constraints = self.table_constraints.setdefault(table_name, {})
+            if constraint not in constraints:
+                constraints[constraint] = {
+                    'columns': [],
+                    'primary_key': False,
+                    'unique': False,
+                    'index': False,
+                    'check': False,
+                    'foreign_key': (ref_table, ref_column) if ref_column else None,
+                }
+            if column not in constraints[constraint]['columns']:
+                constraints[constraint]['columns'].append(column)
+
+        cursor.execute("""
+            SELECT c.table_name, c.constraint_name, c.constraint_type
+            FROM information_schema.table_constraints AS c
+            WHERE c.table_schema = DATABASE()""")
+        for table_name, name, kind in cursor.fetchall():
+            constraint = self.table_constraints.get(table_name, {}).get(name)
+            if constraint is None:
+                continue
+            if kind.lower() == "primary key":
+                constraint['primary_key'] = True
+                constraint['unique'] = True
+            elif kind.lower() == "unique":
+                constraint['unique'] = True
+
+        # the same rows as SHOW INDEX for every table
+        cursor.execute("""
+            SELECT table_name, non_unique, index_name, seq_in_index, column_name
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE()
+            ORDER BY table_name, index_name, seq_in_index""")
+        rows = cursor.fetchall()
+        multicol_indexes = set((row[0], row[2]) for row in rows if row[3] > 1)
+        for table_name, non_unique, index, colseq, column in rows:
+            constraints = self.table_constraints.setdefault(table_name, {})
+            if index not in constraints:
+                constraints[index] = {
+                    'columns': [],
+                    'primary_key': False,
+                    'unique': False,
+                    'index': True,
+                    'check': False,
+                    'foreign_key': None,
+                }
+            constraints[index]['index'] = True
+            if column not in constraints[index]['columns']:
+                constraints[index]['columns'].append(column)
+
+            # the layout of the indexes matches introspection.get_indexes()
+            indexes = self.table_indexes.setdefault(table_name, {})
+            if (table_name, index) in multicol_indexes:
+                continue
+            if column not in indexes:
+                indexes[column] = {'primary_key': False, 'unique': False}
+            # it's possible to have the unique and PK constraints in separate indexes
+            if index == 'PRIMARY':
+                indexes[column]['primary_key'] = True
+            if not non_unique:
+                indexes[column]['unique'] = True
+
         for table_name in self.db_tables:
-            result = self.sql_to_dict("""
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_schema = DATABASE()
-                   AND table_name = %s
-                   AND extra = 'auto_increment'""", [table_name])
-            for table_info in result:
-                key = (table_name, table_info['column_name'])
-                self.auto_increment.add(key)
+            self.table_indexes.setdefault(table_name, {})
+            self.table_constraints.setdefault(table_name, {})
 
     # All the MySQL hacks together create something of a problem
     # Fixing one bug in MySQL creates another issue. So just keep in mind
@@ -645,21 +1258,116 @@ class MySQLDiff(SQLDiff):
 class SqliteSQLDiff(SQLDiff):
     can_detect_notnull_differ = True
 
+    # the pragma table-valued functions are available since SQLite 3.16
+    SQL_LOAD_COLUMNS = """
+    SELECT m.name, p.name, p.type, p."notnull", p.dflt_value, p.pk
+    FROM sqlite_master m, pragma_table_info(m.name) p
+    WHERE m.type IN ('table', 'view') AND m.name != 'sqlite_sequence'
+    ORDER BY m.name, p.cid;
+    """
+    SQL_LOAD_INDEXES = """
+    SELECT m.name, il.name, il."unique", ii.name
+    FROM sqlite_master m, pragma_index_list(m.name) il, pragma_index_info(il.name) ii
+    WHERE m.type = 'table'
+    ORDER BY m.name, il.seq, ii.seqno;
+    """
+    SQL_LOAD_TABLES = """
+    SELECT name, sql FROM sqlite_master WHERE type = 'table';
+    """
+
+    def can_load_catalog(self):
+        return self.connection.Database.sqlite_version_info >= (3, 16, 0)
+
     def load_null(self):
+        if self.can_load_catalog():
+            # filled in by load_catalog
+            return
         for table_name in self.db_tables:
             # sqlite does not support tablespaces
-            tablespace = "public"
+            tablespace = self.schema
             # index, column_name, column_type, nullable, default_value
             # see: http://www.sqlite.org/pragma.html#pragma_table_info
             for table_info in self.sql_to_dict("PRAGMA table_info(%s);" % table_name, []):
                 key = (tablespace, table_name, table_info['name'])
                 self.null[key] = not table_info['notnull']
 
+    def load_catalog(self):
+        if not self.can_load_catalog():
+            return
+        from django.db.backends.sqlite3.introspection import get_field_size
+
+        cursor = self.connection.cursor()
+        cursor.execute(self.SQL_LOAD_COLUMNS)
+        for table_name, name, type_code, notnull, default, pk in cursor.fetchall():
+            description = self.make_field_info((name, type_code, None, get_field_size(type_code), None, None, not notnull, default))
+            self.table_descriptions.setdefault(table_name, []).append(description)
+            self.null[(self.schema, table_name, name)] = not notnull
+            # the layout of the indexes matches introspection.get_indexes()
+            indexes = self.table_indexes.setdefault(table_name, {})
+            if pk != 0:
+                indexes[name] = {'primary_key': True, 'unique': False}
+
+        # the layout of the constraints matches introspection.get_constraints()
+        cursor.execute(self.SQL_LOAD_INDEXES)
+        index_columns = {}
+        for table_name, index, unique, column in cursor.fetchall():
+            constraints = self.table_constraints.setdefault(table_name, {})
+            if index not in constraints:
+                constraints[index] = {
+                    "columns": [],
+                    "primary_key": False,
+                    "unique": bool(unique),
+                    "foreign_key": False,
+                    "check": False,
+                    "index": True,
+                }
+                index_columns.setdefault(table_name, []).append((index, unique))
+            constraints[index]['columns'].append(column)
+
+        for table_name, table_index_columns in six.iteritems(index_columns):
+            indexes = self.table_indexes.setdefault(table_name, {})
+            for index, unique in table_index_columns:
+                columns = self.table_constraints[table_name][index]['columns']
+                # skip indexes across multiple fields
+                if len(columns) != 1:
+                    continue
+                indexes[columns[0]] = {
+                    'primary_key': indexes.get(columns[0], {}).get('primary_key', False),
+                    'unique': unique,
+                }
+
+        cursor.execute(self.SQL_LOAD_TABLES)
+        for table_name, sql in cursor.fetchall():
+            constraints = self.table_constraints.setdefault(table_name, {})
+            pk_column = self.get_primary_key_column(sql) if sql else None
+            if pk_column:
+                constraints["__primary__"] = {
+                    "columns": [pk_column],
+                    "primary_key": True,
+                    "unique": False,
+                    "foreign_key": False,
+                    "check": False,
+                    "index": False,
+                }
+
+        for table_name in self.table_descriptions:
+            self.table_indexes.setdefault(table_name, {})
+            self.table_constraints.setdefault(table_name, {})
+
+    def get_primary_key_column(self, sql):
+        # as introspection.get_primary_key_column() but from the CREATE TABLE statement
+        sql = sql.strip()
+        for field_desc in sql[sql.index('(') + 1:sql.rindex(')')].split(','):
+            m = re.search('"(.*)".*PRIMARY KEY( AUTOINCREMENT)?$', field_desc.strip())
+            if m:
+                return m.groups()[0]
+        return None
+
     # Unique does not seem to be implied on Sqlite for Primary_key's
     # if this is more generic among databases this might be usefull
     # to add to the superclass's find_unique_missing_in_db method
     def find_unique_missing_in_db(self, meta, table_indexes, table_constraints, table_name):
-        for field in all_local_fields(meta):
+        for field in self.get_model_snapshot(meta).local_fields:
             if field.unique:
                 attname = field.db_column or field.attname
                 if attname in table_indexes and table_indexes[attname]['unique']:
@@ -673,6 +1381,15 @@ class SqliteSQLDiff(SQLDiff):
     def find_index_missing_in_db(self, meta, table_indexes, table_constraints, table_name):
         pass
 
+    def get_index_columns(self, table_name):
+        # introspection invents the __primary__ constraint, for primary keys
+        # other than INTEGER it is backed by an sqlite_autoindex
+        indexes = super(SqliteSQLDiff, self).get_index_columns(table_name)
+        primary = [index for index in indexes if index[0] == '__primary__']
+        if primary and any(index[1] == primary[0][1] for index in indexes if index is not primary[0]):
+            indexes.remove(primary[0])
+        return indexes
+
     def find_index_missing_in_model(self, meta, table_indexes, table_constraints, table_name):
         pass
 
@@ -691,6 +1408,8 @@ class SqliteSQLDiff(SQLDiff):
 class PostgresqlSQLDiff(SQLDiff):
     can_detect_notnull_differ = True
     can_detect_unsigned_differ = True
+    can_group_alter_table = True
+    can_create_index_concurrently = True
 
     DATA_TYPES_REVERSE_OVERRIDE = {
         1042: 'CharField',
@@ -722,14 +1441,86 @@ class PostgresqlSQLDiff(SQLDiff):
     INNER JOIN pg_namespace ON pg_namespace.oid=pg_class.relnamespace;
     """
 
+    SQL_LOAD_COLUMNS = """
+    SELECT c.relname, a.attname,
+        CASE WHEN t.typtype = 'd' THEN t.typbasetype ELSE a.atttypid END,
+        t.typlen,
+        CASE WHEN t.typtype = 'd' THEN t.typtypmod ELSE a.atttypmod END,
+        NOT a.attnotnull,
+        pg_get_expr(d.adbin, d.adrelid)
+    FROM pg_attribute a
+    INNER JOIN pg_class c ON a.attrelid = c.oid
+    INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+    INNER JOIN pg_type t ON t.oid = a.atttypid
+    LEFT JOIN pg_attrdef d ON d.adrelid = a.attrelid AND d.adnum = a.attnum
+    WHERE n.nspname = %s AND c.relkind IN ('r', 'v') AND a.attnum > 0 AND NOT a.attisdropped
+    ORDER BY c.relname, a.attnum;
+    """
+    SQL_LOAD_KEYS = """
+    SELECT c.relname, con.conname, con.contype,
+        ARRAY(
+            SELECT (SELECT attname FROM pg_attribute WHERE attnum = k AND attrelid = con.conrelid)
+            FROM unnest(con.conkey) k
+        ),
+        fc.relname,
+        (SELECT attname FROM pg_attribute WHERE attnum = con.confkey[1] AND attrelid = con.confrelid)
+    FROM pg_constraint con
+    INNER JOIN pg_class c ON c.oid = con.conrelid
+    INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_class fc ON fc.oid = con.confrelid
+    WHERE n.nspname = %s AND con.contype IN ('p', 'u', 'f', 'c');
+    """
+    SQL_LOAD_INDEXES = """
+    SELECT c.relname, c2.relname,
+        ARRAY(
+            SELECT (SELECT attname FROM pg_attribute WHERE attnum = i AND attrelid = c.oid)
+            FROM unnest(idx.indkey) i
+        ),
+        idx.indisunique, idx.indisprimary
+    FROM pg_index idx
+    INNER JOIN pg_class c ON c.oid = idx.indrelid
+    INNER JOIN pg_class c2 ON c2.oid = idx.indexrelid
+    INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s;
+    """
+    SQL_LOAD_TABLE_SIZES = """
+    SELECT c.relname, c.reltuples, pg_total_relation_size(c.oid)
+    FROM pg_class c
+    INNER JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s AND c.relkind IN ('r', 'm', 'p');
+    """
+    NUMERIC_TYPE_CODE = 1700
+
     SQL_FIELD_TYPE_DIFFER = lambda self, style, qn, args: "%s %s\n\t%s %s %s %s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD('ALTER'), style.SQL_FIELD(qn(args[1])), style.SQL_KEYWORD("TYPE"), style.SQL_COLTYPE(args[2]))
     SQL_FIELD_PARAMETER_DIFFER = lambda self, style, qn, args: "%s %s\n\t%s %s %s %s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD('ALTER'), style.SQL_FIELD(qn(args[1])), style.SQL_KEYWORD("TYPE"), style.SQL_COLTYPE(args[2]))
     SQL_NOTNULL_DIFFER = lambda self, style, qn, args: "%s %s\n\t%s %s %s %s;" % (style.SQL_KEYWORD('ALTER TABLE'), style.SQL_TABLE(qn(args[0])), style.SQL_KEYWORD('ALTER COLUMN'), style.SQL_FIELD(qn(args[1])), style.SQL_KEYWORD(args[2]), style.SQL_KEYWORD('NOT NULL'))
+    SQL_INDEX_MISSING_IN_DB_CONCURRENTLY = lambda self, style, qn, args: "%s %s\n\t%s %s (%s%s);" % (style.SQL_KEYWORD('CREATE INDEX CONCURRENTLY'), style.SQL_TABLE(qn("%s" % '_'.join(a for a in args[0:3] if a))), style.SQL_KEYWORD('ON'), style.SQL_TABLE(qn(args[0])), style.SQL_FIELD(qn(args[1])), style.SQL_KEYWORD(args[3]))
+    SQL_INDEX_MISSING_IN_MODEL_CONCURRENTLY = lambda self, style, qn, args: "%s %s;" % (style.SQL_KEYWORD('DROP INDEX CONCURRENTLY'), style.SQL_TABLE(qn("%s" % '_'.join(a for a in args[0:3] if a))))
 
-    def __init__(self, app_models, options):
-        super(PostgresqlSQLDiff, self).__init__(app_models, options)
+    def __init__(self, app_models, options, using=DEFAULT_DB_ALIAS, schema=None, snapshot=None, connection=None):
         self.check_constraints = {}
-        self.load_constraints()
+        super(PostgresqlSQLDiff, self).__init__(app_models, options, using, schema, snapshot, connection)
+        if options.get('concurrently'):
+            # CONCURRENTLY does not lock out writes but can not run in a transaction,
+            # indexes are dropped before and created after the other statements
+            self.DIFF_SQL['index-missing-in-db'] = self.SQL_INDEX_MISSING_IN_DB_CONCURRENTLY
+            self.DIFF_SQL['index-missing-in-model'] = self.SQL_INDEX_MISSING_IN_MODEL_CONCURRENTLY
+            self.pre_transaction_diffs = ('index-missing-in-model', )
+            self.post_transaction_diffs = ('index-missing-in-db', )
+        if snapshot is None:
+            self.load_constraints()
+
+    def get_snapshot(self):
+        snapshot = super(PostgresqlSQLDiff, self).get_snapshot()
+        snapshot['check_constraints'] = [list(key) + [value] for key, value in six.iteritems(self.check_constraints) if key[1] in snapshot['tables']]
+        return snapshot
+
+    def restore_snapshot(self, snapshot):
+        super(PostgresqlSQLDiff, self).restore_snapshot(snapshot)
+        self.check_constraints = dict((tuple(row[:3]), row[3]) for row in snapshot['check_constraints'])
+
+    def set_schema(self, schema):
+        self.cursor.execute("SET search_path TO %s" % self.connection.ops.quote_name(schema))
 
     def load_null(self):
         for dct in self.sql_to_dict(self.SQL_LOAD_NULL, []):
@@ -741,6 +1532,86 @@ class PostgresqlSQLDiff(SQLDiff):
         # unsigned. Nothing to do.
         pass
 
+    def load_catalog(self):
+        schema = self.schema
+        cursor = self.connection.cursor()
+
+        cursor.execute(self.SQL_LOAD_COLUMNS, [schema])
+        for table_name, name, type_code, typlen, typmod, null_ok, default in cursor.fetchall():
+            description = self.get_column_description(name, type_code, typlen, typmod, null_ok, default)
+            self.table_descriptions.setdefault(table_name, []).append(description)
+
+        # the layout of the constraints matches introspection.get_constraints()
+        cursor.execute(self.SQL_LOAD_KEYS, [schema])
+        for table_name, name, kind, columns, fk_table, fk_column in cursor.fetchall():
+            self.table_constraints.setdefault(table_name, {})[name] = {
+                "columns": list(columns),
+                "primary_key": kind == 'p',
+                "unique": kind in ('p', 'u'),
+                "foreign_key": (fk_table, fk_column) if kind == 'f' else None,
+                "check": kind == 'c',
+                "index": False,
+            }
+
+        # the layout of the indexes matches introspection.get_indexes()
+        cursor.execute(self.SQL_LOAD_INDEXES, [schema])
+        for table_name, name, columns, unique, primary in cursor.fetchall():
+            constraints = self.table_constraints.setdefault(table_name, {})
+            if name not in constraints:
+                constraints[name] = {
+                    "columns": list(columns),
+                    "primary_key": primary,
+                    "unique": unique,
+                    "foreign_key": None,
+                    "check": False,
+                    "index": True,
+                }
+            indexes = self.table_indexes.setdefault(table_name, {})
+            if len(columns) != 1 or columns[0] is None:
+                continue
+            index = indexes.setdefault(columns[0], {'primary_key': False, 'unique': False})
+            if primary:
+                index['primary_key'] = True
+            if unique:
+                index['unique'] = True
+
+        for table_name in self.table_descriptions:
+            self.table_indexes.setdefault(table_name, {})
+            self.table_constraints.setdefault(table_name, {})
+
+    def load_table_sizes(self):
+        table_sizes = {}
+        cursor = self.connection.cursor()
+        cursor.execute(self.SQL_LOAD_TABLE_SIZES, [self.schema])
+        for table_name, rows, size in cursor.fetchall():
+            # reltuples is negative for tables which were never analyzed
+            if rows >= 0:
+                table_sizes[table_name] = (int(rows), size)
+        return table_sizes
+
+    def get_index_columns(self, table_name):
+        # the varchar_pattern_ops indexes Django adds for LIKE queries are
+        # neither duplicates of the plain index on a column nor usable for it
+        indexes = super(PostgresqlSQLDiff, self).get_index_columns(table_name)
+        return [index for index in indexes if not index[0].endswith('_like')]
+
+    def get_column_description(self, name, type_code, typlen, typmod, null_ok, default):
+        """
+        Returns the same FieldInfo for a column as introspection.get_table_description()
+        which derives it from psycopg2's cursor.description.
+        """
+        if typmod > 0:
+            typmod -= 4
+        if typlen == -1:
+            internal_size = typmod >> 16 if type_code == self.NUMERIC_TYPE_CODE else typmod
+        else:
+            internal_size = typlen
+        if type_code == self.NUMERIC_TYPE_CODE:
+            precision, scale = (typmod >> 16) & 0xFFFF, typmod & 0xFFFF
+        else:
+            precision, scale = None, None
+        return self.make_field_info((name, type_code, None, internal_size, precision, scale, null_ok, default))
+
     def load_constraints(self):
         for dct in self.sql_to_dict(self.SQL_LOAD_CONSTRAINTS, []):
             key = (dct['nspname'], dct['relname'], dct['attname'])
@@ -766,7 +1637,7 @@ class PostgresqlSQLDiff(SQLDiff):
             WHERE
                 kc.table_schema = %s AND
                 kc.table_name = %s
-        """, ["public", table_name])
+        """, [self.schema, table_name])
         for constraint, column, kind, used_cols in cursor.fetchall():
             # If we're the first column, make the record
             if constraint not in constraints:
@@ -792,7 +1663,7 @@ class PostgresqlSQLDiff(SQLDiff):
                 c.constraint_type = 'CHECK' AND
                 kc.table_schema = %s AND
                 kc.table_name = %s
-        """, ["public", table_name])
+        """, [self.schema, table_name])
         for constraint, column in cursor.fetchall():
             # If we're the first column, make the record
             if constraint not in constraints:
@@ -847,7 +1718,7 @@ class PostgresqlSQLDiff(SQLDiff):
             if table_name:
                 tablespace = field.db_tablespace
                 if tablespace == "":
-                    tablespace = "public"
+                    tablespace = self.schema
                 attname = field.db_column or field.attname
                 check_constraint = self.check_constraints.get((tablespace, table_name, attname), {}).get('pg_get_constraintdef', None)
                 if check_constraint:
@@ -906,6 +1777,14 @@ to check/debug ur models compared to the real database tables and columns."""
             dest='only_existing',
             help="Check all tables that exist in the database, not only "
             "tables that should exist based on models.")
+        parser.add_argument(
+            '--performance', action='store_true', dest='performance',
+            help="Adds performance advisories about missing, redundant and "
+            "duplicate indexes along with estimated table sizes.")
+        parser.add_argument(
+            '--concurrently', action='store_true', dest='concurrently',
+            help="PostgreSQL only: creates and drops indexes CONCURRENTLY, "
+            "outside of the transaction, to avoid locking out writes.")
         parser.add_argument(
             '--dense-output', '-d', action='store_true', dest='dense_output',
             help="Shows the output in dense format, normally output is "
@@ -914,29 +1793,163 @@ to check/debug ur models compared to the real database tables and columns."""
             '--output_text', '-t', action='store_false', dest='sql',
             default=True,
             help="Outputs the differences as descriptive text instead of SQL")
+        parser.add_argument(
+            '--output', '-o', choices=['sql', 'text', 'json'], dest='output',
+            help="Output format of the differences, defaults to sql.")
+        parser.add_argument(
+            '--emit-migration', dest='emit_migration', metavar='APP_LABEL',
+            help="Outputs a migration for app_label fixing the differences "
+            "instead of SQL.")
+        parser.add_argument(
+            '--save-snapshot', dest='save_snapshot', metavar='FILENAME',
+            help="Saves the introspected database schema to a file.")
+        parser.add_argument(
+            '--against-snapshot', dest='against_snapshot', metavar='FILENAME',
+            help="Compares the models with a schema saved by --save-snapshot "
+            "instead of a live database.")
+        parser.add_argument(
+            '--database', action='append', dest='databases',
+            help="Nominates a database to compare the models with, can be "
+            "given multiple times. Defaults to the 'default' database.")
+        parser.add_argument(
+            '--schema', action='append', dest='schemas',
+            help="Nominates a PostgreSQL schema to compare the models with, "
+            "can be given multiple times. Defaults to the 'public' schema.")
+        parser.add_argument(
+            '--parallel', type=int, dest='parallel', default=4,
+            help="Number of databases and schemas introspected concurrently.")
 
     def __init__(self, *args, **kwargs):
         super(Command, self).__init__(*args, **kwargs)
         self.exit_code = 1
 
-    @signalcommand
-    def handle(self, *args, **options):
-        from django.conf import settings
+    def get_sqldiff_class(self, using):
+        engine = connections[using].settings_dict['ENGINE']
 
-        app_labels = options.get('app_label')
-        engine = None
-        if hasattr(settings, 'DATABASES'):
-            engine = settings.DATABASES['default']['ENGINE']
-        else:
-            engine = settings.DATABASE_ENGINE
-
-        if engine == 'dummy':
+        if engine == 'dummy' or engine.endswith('.dummy'):
             # This must be the "dummy" database backend, which means the user
             # hasn't set DATABASE_ENGINE.
             raise CommandError("""Django doesn't know which syntax to use for your SQL statements,
 because you haven't specified the DATABASE_ENGINE setting.
 Edit your settings file and change DATABASE_ENGINE to something like 'postgresql' or 'mysql'.""")
 
+        if not engine:
+            engine = connections[using].__module__.split('.')[-2]
+
+        if '.' in engine:
+            engine = engine.split('.')[-1]
+
+        return DATABASE_SQLDIFF_CLASSES.get(engine, GenericSQLDiff)
+
+    def run_sqldiff(self, app_models, options, using, schema):
+        cls = self.get_sqldiff_class(using)
+        sqldiff_instance = cls(app_models, options, using=using, schema=schema)
+        sqldiff_instance.find_differences()
+        return sqldiff_instance
+
+    def run_sqldiff_against_snapshot(self, app_models, options, filename):
+        from django.db.utils import load_backend
+
+        try:
+            with open(filename) as f:
+                snapshot = json.load(f)
+        except (IOError, ValueError) as e:
+            raise CommandError("Unable to read snapshot %s: %s" % (filename, e))
+
+        engine = snapshot['engine']
+        # a connection object of the snapshot's backend which is never opened
+        settings_dict = dict(connections[DEFAULT_DB_ALIAS].settings_dict, ENGINE=engine)
+        connection = load_backend(engine).DatabaseWrapper(settings_dict, 'snapshot')
+        cls = DATABASE_SQLDIFF_CLASSES.get(engine.split('.')[-1], GenericSQLDiff)
+        sqldiff_instance = cls(app_models, options, snapshot=snapshot, connection=connection)
+        sqldiff_instance.find_differences()
+        return sqldiff_instance
+
+    def print_result(self, sqldiff_instance, options):
+        if options.get('emit_migration'):
+            self.emit_migration(sqldiff_instance, options['emit_migration'])
+        else:
+            sqldiff_instance.print_diff(self.style)
+
+    def emit_migration(self, sqldiff_instance, app_label):
+        from django.db.migrations.writer import MigrationWriter
+
+        migration, skipped = sqldiff_instance.get_migration(app_label)
+        output = MigrationWriter(migration).as_string()
+        if isinstance(output, six.binary_type):
+            output = output.decode('utf-8')
+        if not migration.atomic:
+            # the migration writer does not write the atomic attribute
+            output = output.replace(
+                "class Migration(migrations.Migration):\n",
+                "class Migration(migrations.Migration):\n\n    atomic = False\n", 1)
+        print(output)
+        for diff_type, diff_args in skipped:
+            text = sqldiff_instance.DIFF_TEXTS[diff_type] % dict((str(i), e) for i, e in enumerate(diff_args))
+            self.stderr.write("Not included in the migration: %s" % text)
+
+    def save_snapshot(self, sqldiff_instance, filename):
+        try:
+            data = json.dumps(sqldiff_instance.get_snapshot(), indent=1, sort_keys=True)
+        except TypeError as e:
+            raise CommandError("Unable to save a snapshot for this database backend: %s" % e)
+        with open(filename, 'w') as f:
+            f.write(data)
+
+    def run_sqldiffs(self, app_models, options, targets):
+        """
+        Runs sqldiff for every (database, schema) target using a pool of
+        threads, each thread with its own database connections.
+        """
+        results = {}
+        errors = []
+        pending = list(targets)
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    using, schema = pending.pop(0)
+                try:
+                    results[(using, schema)] = self.run_sqldiff(app_models, options, using, schema)
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    connections[using].close()
+
+        threads = [threading.Thread(target=worker) for i in range(min(max(options.get('parallel') or 1, 1), len(targets)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return [(target, results[target]) for target in targets]
+
+    @signalcommand
+    def handle(self, *args, **options):
+        app_labels = options.get('app_label')
+
+        databases = options.get('databases') or [DEFAULT_DB_ALIAS]
+        schemas = options.get('schemas') or [None]
+        targets = []
+        for using in databases:
+            for schema in schemas:
+                if (using, schema) not in targets:
+                    targets.append((using, schema))
+        for using in databases:
+            if using not in connections:
+                raise CommandError("Unknown database: %s" % using)
+            self.get_sqldiff_class(using)
+
+        if options.get('emit_migration'):
+            if len(targets) > 1:
+                raise CommandError('A migration can only be emitted for a single database and schema.')
+            if not app_labels:
+                app_labels = [options['emit_migration']]
+
         if options.get('all_applications', False):
             app_models = apps.get_models(include_auto_created=True)
         else:
@@ -954,18 +1967,50 @@ Edit your settings file and change DATABASE_ENGINE to something like 'postgresql
         if not app_models:
             raise CommandError('Unable to execute sqldiff no models founds.')
 
-        if not engine:
-            engine = connection.__module__.split('.')[-2]
+        if (options.get('save_snapshot') or options.get('against_snapshot')) and len(targets) > 1:
+            raise CommandError('Snapshots can only be used with a single database and schema.')
 
-        if '.' in engine:
-            engine = engine.split('.')[-1]
+        if options.get('against_snapshot'):
+            sqldiff_instance = self.run_sqldiff_against_snapshot(app_models, options, options['against_snapshot'])
+            if not sqldiff_instance.has_differences:
+                self.exit_code = 0
+            self.print_result(sqldiff_instance, options)
+            return
 
-        cls = DATABASE_SQLDIFF_CLASSES.get(engine, GenericSQLDiff)
-        sqldiff_instance = cls(app_models, options)
-        sqldiff_instance.find_differences()
-        if not sqldiff_instance.has_differences:
+        if len(targets) == 1:
+            sqldiff_instance = self.run_sqldiff(app_models, options, *targets[0])
+            if options.get('save_snapshot'):
+                self.save_snapshot(sqldiff_instance, options['save_snapshot'])
+            if not sqldiff_instance.has_differences:
+                self.exit_code = 0
+            self.print_result(sqldiff_instance, options)
+            return
+
+        results = self.run_sqldiffs(app_models, options, targets)
+        if not any(sqldiff_instance.has_differences for target, sqldiff_instance in results):
             self.exit_code = 0
-        sqldiff_instance.print_diff(self.style)
+
+        output = options.get('output') or ('sql' if options.get('sql', True) else 'text')
+        if output == 'json':
+            data = {}
+            for (using, schema), sqldiff_instance in results:
+                data["%s.%s" % (using, schema) if schema else using] = sqldiff_instance.get_diff_data()
+            print(json.dumps(data, indent=None if options.get('dense_output') else 4, default=str))
+            return
+
+        comment = '--' if output == 'sql' else '#'
+        drifting = []
+        for (using, schema), sqldiff_instance in results:
+            target = "%s.%s" % (using, schema) if schema else using
+            print(self.style.NOTICE("%s Target: %s" % (comment, target)))
+            sqldiff_instance.print_diff(self.style)
+            print("")
+            if sqldiff_instance.has_differences:
+                drifting.append(target)
+        if drifting:
+            print(self.style.NOTICE("%s Targets with differences: %s" % (comment, ', '.join(drifting))))
+        else:
+            print(self.style.NOTICE("%s No differences in any target" % comment))
 
     def execute(self, *args, **options):
         try:
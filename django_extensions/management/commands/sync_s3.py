@@ -35,7 +35,8 @@ Command options are:
   --gzip                Enables gzipping CSS and Javascript files.
   --expires             Enables setting a far future expires header.
   --force               Skip the file mtime check to force upload of all
-                        files.
+                        files. Without it the keys under the prefix are
+                        listed once to compare them with the local files.
   --filter-list         Override default directory and file exclusion
                         filters. (enter as comma separated line)
   --renamegzip          Enables renaming of gzipped files by appending '.gz'.
@@ -51,6 +52,8 @@ Command options are:
   --s3host              Override default s3 host.
   --acl                 Override default ACL settings ('public-read' if
                         settings.AWS_DEFAULT_ACL is not defined).
+  --concurrency=N       Number of files uploaded at the same time, each
+                        thread uses its own connection (default 1).
 
 TODO:
  * Use fnmatch (or regex) to allow more complex FILTER_LIST rules.
@@ -61,11 +64,12 @@ import email
 import gzip
 import mimetypes
 import os
+import threading
 import time
 
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.utils.six import StringIO
+from django.utils.six import BytesIO
 
 from django_extensions.management.utils import signalcommand
 
@@ -73,6 +77,7 @@ from django_extensions.management.utils import signalcommand
 try:
     import boto
     import boto.exception
+    import boto.utils
     HAS_BOTO = True
 except ImportError:
     HAS_BOTO = False
@@ -150,6 +155,10 @@ class Command(BaseCommand):
         parser.add_argument('--static-only', dest='static_only', default='',
                     action='store_true',
                     help="Only STATIC_ROOT files will be uploaded to S3")
+        parser.add_argument('--concurrency', dest='concurrency', default=1,
+                    type=int,
+                    help="Number of files uploaded at the same time, each "
+                    "thread uses its own connection (default 1)")
 
     @signalcommand
     def handle(self, *args, **options):
@@ -181,6 +190,10 @@ class Command(BaseCommand):
         self.SYNC_S3_RENAME_GZIP_EXT = \
             getattr(settings, 'SYNC_S3_RENAME_GZIP_EXT', '.gz')
 
+        self.uploaded_files = []
+        self.upload_count = 0
+        self.skip_count = 0
+
         self.verbosity = int(options.get('verbosity'))
         self.prefix = options.get('prefix')
         self.do_gzip = options.get('gzip')
@@ -191,6 +204,9 @@ class Command(BaseCommand):
         self.DIRECTORIES = options.get('dir')
         self.s3host = options.get('s3host')
         self.default_acl = options.get('acl')
+        self.concurrency = options.get('concurrency', 1)
+        if self.concurrency < 1:
+            raise CommandError('--concurrency must be at least 1.')
         self.FILTER_LIST = getattr(settings, 'FILTER_LIST', self.FILTER_LIST)
         filter_list = options.get('filter_list')
         if filter_list:
@@ -262,13 +278,40 @@ class Command(BaseCommand):
         Walks the media/static directories and syncs files to S3
         """
         bucket, key = self.open_s3()
+        self.files_to_upload = []
+        if not self.do_force:
+            self.s3_keys = self.list_s3(bucket)
         for directory in self.DIRECTORIES:
             for root, dirs, files in os.walk(directory):
                 self.upload_s3((bucket, key, self.AWS_BUCKET_NAME, directory), root, files)
 
+        if self.concurrency > 1 and len(self.files_to_upload) > 1:
+            from multiprocessing.pool import ThreadPool
+
+            local = threading.local()
+
+            def upload_file(args):
+                # boto connections are not thread safe, every thread opens its own
+                if not hasattr(local, 'key'):
+                    local.key = self.open_s3()[1]
+                return (args[1],) + self.upload_file(local.key, *args)
+
+            pool = ThreadPool(self.concurrency)
+            try:
+                # results come back in the order of the files, which keeps
+                # the output and uploaded_files the same as without threads
+                results = pool.imap(upload_file, self.files_to_upload)
+                for result in results:
+                    self.finish_upload(*result)
+            finally:
+                pool.terminate()
+        else:
+            for filename, file_key in self.files_to_upload:
+                self.finish_upload(file_key, *self.upload_file(key, filename, file_key))
+
     def compress_string(self, s):
         """Gzip a given string."""
-        zbuf = StringIO()
+        zbuf = BytesIO()
         zfile = gzip.GzipFile(mode='wb', compresslevel=6, fileobj=zbuf)
         zfile.write(s)
         zfile.close()
@@ -295,9 +338,22 @@ class Command(BaseCommand):
             bucket = conn.create_bucket(self.AWS_BUCKET_NAME)
         return bucket, boto.s3.key.Key(bucket)
 
+    def list_s3(self, bucket):
+        """
+        Returns a map of the names of the keys under the prefix to their
+        last_modified timestamp. The bucket is listed with paginated
+        requests of up to 1000 keys instead of requesting every key.
+        """
+        prefix = '%s/' % self.prefix if self.prefix else ''
+        s3_keys = {}
+        for s3_key in bucket.list(prefix=prefix):
+            s3_keys[s3_key.name] = s3_key.last_modified
+        return s3_keys
+
     def upload_s3(self, arg, dirname, names):
         """
-        This is the callback to os.path.walk and where much of the work happens
+        This is the callback to os.path.walk, which adds the files to upload
+        to self.files_to_upload
         """
         bucket, key, bucket_name, root_dir = arg
 
@@ -312,8 +368,6 @@ class Command(BaseCommand):
             root_dir = root_dir + os.path.sep
 
         for file in names:
-            headers = {}
-
             if file in self.FILTER_LIST:
                 continue  # Skip files we don't want to sync
 
@@ -327,10 +381,10 @@ class Command(BaseCommand):
 
             # Check if file on S3 is older than local file, if so, upload
             if not self.do_force:
-                s3_key = bucket.get_key(file_key)
-                if s3_key:
-                    s3_datetime = datetime.datetime(*time.strptime(
-                        s3_key.last_modified, '%a, %d %b %Y %H:%M:%S %Z')[0:6])
+                last_modified = self.s3_keys.get(file_key)
+                if last_modified:
+                    # listings use ISO 8601 timestamps, parse_ts handles them
+                    s3_datetime = boto.utils.parse_ts(last_modified)
                     local_datetime = datetime.datetime.utcfromtimestamp(
                         os.stat(filename).st_mtime)
                     if local_datetime < s3_datetime:
@@ -339,53 +393,69 @@ class Command(BaseCommand):
                             print("File %s hasn't been modified since last being uploaded" % file_key)
                         continue
 
-            # File is newer, let's process and upload
-            if self.verbosity > 0:
-                print("Uploading %s..." % file_key)
-
-            content_type = mimetypes.guess_type(filename)[0]
-            if content_type:
-                headers['Content-Type'] = content_type
-            else:
-                headers['Content-Type'] = 'application/octet-stream'
-
-            file_obj = open(filename, 'rb')
-            file_size = os.fstat(file_obj.fileno()).st_size
-            filedata = file_obj.read()
-            if self.do_gzip:
-                # Gzipping only if file is large enough (>1K is recommended)
-                # and only if file is a common text type (not a binary file)
-                if file_size > 1024 and content_type in self.GZIP_CONTENT_TYPES:
-                    filedata = self.compress_string(filedata)
-                    if self.rename_gzip:
-                        # If rename_gzip is True, then rename the file
-                        # by appending an extension (like '.gz)' to
-                        # original filename.
-                        file_key = '%s.%s' % (
-                            file_key, self.SYNC_S3_RENAME_GZIP_EXT)
-                    headers['Content-Encoding'] = 'gzip'
-                    if self.verbosity > 1:
-                        print("\tgzipped: %dk to %dk" % (file_size / 1024, len(filedata) / 1024))
-            if self.do_expires:
-                # HTTP/1.0
-                headers['Expires'] = '%s GMT' % (email.Utils.formatdate(time.mktime((datetime.datetime.now() + datetime.timedelta(days=365 * 2)).timetuple())))
-                # HTTP/1.1
-                headers['Cache-Control'] = 'max-age %d' % (3600 * 24 * 365 * 2)
-                if self.verbosity > 1:
-                    print("\texpires: %s" % headers['Expires'])
-                    print("\tcache-control: %s" % headers['Cache-Control'])
+            self.files_to_upload.append((filename, file_key))
 
-            try:
-                key.name = file_key
-                key.set_contents_from_string(filedata, headers, replace=True,
-                                             policy=self.default_acl)
-            except boto.exception.S3CreateError as e:
-                print("Failed: %s" % e)
-            except Exception as e:
-                print(e)
-                raise
-            else:
-                self.upload_count += 1
-                self.uploaded_files.append(file_key)
-
-            file_obj.close()
+    def upload_file(self, key, filename, file_key):
+        """
+        Uploads a file with the given key object and returns the uploaded
+        key, the messages to print and the upload error if any. Called from the
+        upload threads, so it must not change the command's state.
+        """
+        headers = {}
+        messages = []
+
+        content_type = mimetypes.guess_type(filename)[0]
+        if content_type:
+            headers['Content-Type'] = content_type
+        else:
+            headers['Content-Type'] = 'application/octet-stream'
+
+        file_obj = open(filename, 'rb')
+        file_size = os.fstat(file_obj.fileno()).st_size
+        filedata = file_obj.read()
+        file_obj.close()
+        if self.do_gzip:
+            # Gzipping only if file is large enough (>1K is recommended)
+            # and only if file is a common text type (not a binary file)
+            if file_size > 1024 and content_type in self.GZIP_CONTENT_TYPES:
+                filedata = self.compress_string(filedata)
+                if self.rename_gzip:
+                    # If rename_gzip is True, then rename the file
+                    # by appending an extension (like '.gz)' to
+                    # original filename.
+                    file_key = '%s.%s' % (
+                        file_key, self.SYNC_S3_RENAME_GZIP_EXT)
+                headers['Content-Encoding'] = 'gzip'
+                messages.append("\tgzipped: %dk to %dk" % (file_size / 1024, len(filedata) / 1024))
+        if self.do_expires:
+            # HTTP/1.0
+            headers['Expires'] = '%s GMT' % (email.Utils.formatdate(time.mktime((datetime.datetime.now() + datetime.timedelta(days=365 * 2)).timetuple())))
+            # HTTP/1.1
+            headers['Cache-Control'] = 'max-age %d' % (3600 * 24 * 365 * 2)
+            messages.append("\texpires: %s" % headers['Expires'])
+            messages.append("\tcache-control: %s" % headers['Cache-Control'])
+
+        try:
+            key.name = file_key
+            key.set_contents_from_string(filedata, headers, replace=True,
+                                         policy=self.default_acl)
+        except boto.exception.S3CreateError as e:
+            return file_key, messages, e
+        return file_key, messages, None
+
+    def finish_upload(self, file_key, uploaded_key, messages, error):
+        """
+        Prints the messages of an upload and counts it, this is only called
+        from the main thread. uploaded_key differs from file_key when a
+        gzipped file was renamed.
+        """
+        if self.verbosity > 0:
+            print("Uploading %s..." % file_key)
+        if self.verbosity > 1:
+            for message in messages:
+                print(message)
+        if error:
+            print("Failed: %s" % error)
+        else:
+            self.upload_count += 1
+            self.uploaded_files.append(uploaded_key)
@@ -9,7 +9,9 @@ missing will of been added, anything different will of been updated,
 and anything extra will of been deleted.
 """
 
+import json
 import os
+import re
 import sys
 
 import six
@@ -19,37 +21,184 @@ from django.db import connection, transaction
 
 from django_extensions.management.utils import signalcommand
 
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_json(fixture, chunk_size=64 * 1024):
+    """
+    Yields the items of the JSON array in fixture, reading the file in chunks
+    instead of loading it at once.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof, started = '', 0, False, False
+    while True:
+        pos = WHITESPACE.match(buf, pos).end()
+        if pos < len(buf):
+            char = buf[pos]
+            if not started:
+                if char != '[':
+                    raise ValueError("The JSON fixture is not an array")
+                started = True
+                pos += 1
+                continue
+            if char == ']':
+                return
+            if char == ',':
+                pos += 1
+                continue
+            try:
+                item, pos = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # the item may continue in the next chunk
+                if eof:
+                    raise
+            else:
+                yield item
+                continue
+        elif eof:
+            raise ValueError("Unexpected end of the JSON fixture")
+        chunk = fixture.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def iter_json_lines(fixture):
+    """ Yields the JSON object on every line of fixture """
+    for line in fixture:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def has_natural_key(model):
+    """ Returns whether objects of model can be looked up by their natural key """
+    return hasattr(model._default_manager, 'get_by_natural_key')
+
+
+def natural_key_models():
+    """
+    Returns the models which deserialized objects of any installed model may
+    look up by their natural key, those with a natural key which are the
+    target of a relation.
+    """
+    from django.apps import apps
+
+    models = set()
+    for model in apps.get_models():
+        for field in list(model._meta.fields) + list(model._meta.many_to_many):
+            if field.is_relation and field.related_model and has_natural_key(field.related_model):
+                models.add(field.related_model)
+    return models
+
+
+def natural_foreign_key_models(item):
+    """
+    Returns the models in which deserializing the python object item looks
+    up other objects by their natural key.
+    """
+    from django.apps import apps
+
+    try:
+        model = apps.get_model(item['model'])
+    except (KeyError, LookupError, TypeError, ValueError):
+        return set()
+    models = set()
+    fields = item.get('fields') or {}
+    for field in list(model._meta.fields) + list(model._meta.many_to_many):
+        value = fields.get(field.name)
+        if not field.is_relation or value is None or not has_natural_key(field.related_model):
+            continue
+        if field.many_to_many:
+            if any(isinstance(related, (list, tuple)) for related in value):
+                models.add(field.related_model)
+        elif isinstance(value, (list, tuple)):
+            models.add(field.related_model)
+    return models
+
+
+def iter_flushed_items(items, flush):
+    """
+    Yields the python objects of items, calling flush with the models looked
+    up by natural key before yielding an object whose deserialization does.
+    """
+    for item in items:
+        models = natural_foreign_key_models(item)
+        if models:
+            flush(models)
+        yield item
+
+
+def iter_flushed_objects(objects, flush):
+    """
+    Yields the deserialized objects. The model of an object is only known
+    once it is deserialized, so flush is called before every object with the
+    models any installed model may look up by natural key.
+    """
+    models = natural_key_models()
+    objects = iter(objects)
+    while True:
+        flush(models)
+        try:
+            obj = next(objects)
+        except StopIteration:
+            return
+        yield obj
+
+
+# Formats which are read incrementally and then deserialized as python objects
+STREAMING_READERS = {
+    'json': iter_json,
+    'jsonl': iter_json_lines,
+}
+
 
 class Command(BaseCommand):
     """ syncdata command """
 
     help = 'Makes the current database have the same data as the fixture(s), no more, no less.'
-    args = "fixture [fixture ...]"
+
+    # Number of objects handled by a single query
+    batch_size = 500
 
     def add_arguments(self, parser):
         super(Command, self).add_arguments(parser)
+        parser.add_argument('fixture_labels', nargs='+')
         parser.add_argument('--skip-remove', action='store_false',
                             dest='remove', default=True,
                             help='Avoid remove any object from db'),
-
-    def remove_objects_not_in(self, objects_to_keep, verbosity):
+        parser.add_argument('--skip-delete-signals', action='store_false',
+                            dest='delete_signals', default=True,
+                            help='Remove objects with a single query per batch, without sending '
+                                 'delete signals or deleting related objects'),
+        parser.add_argument('--upsert', action='store_true',
+                            dest='upsert', default=False,
+                            help='Compare the fixture with the database, create the new objects in bulk '
+                                 'and only save the objects that changed'),
+
+    def remove_objects_not_in(self, objects_to_keep, verbosity, delete_signals=True):
         """
         Deletes all the objects in the database that are not in objects_to_keep.
         - objects_to_keep: A map where the keys are classes, and the values are a
-         set of the objects of that class we should keep.
+         set of the primary keys of the objects of that class we should keep.
+        - delete_signals: When False the objects are deleted by a single query
+         per batch, without delete signals and without deleting related objects.
         """
         for class_ in objects_to_keep.keys():
-            current = class_.objects.all()
-            current_ids = set([x.pk for x in current])
-            keep_ids = set([x.pk for x in objects_to_keep[class_]])
-
-            remove_these_ones = current_ids.difference(keep_ids)
-            if remove_these_ones:
-                for obj in current:
-                    if obj.pk in remove_these_ones:
-                        obj.delete()
-                        if verbosity >= 2:
-                            print("Deleted object: %s" % six.u(obj))
+            manager = class_._default_manager
+            keep_ids = objects_to_keep[class_]
+
+            # Only the primary keys of the current objects are loaded
+            remove_these_ones = [pk for pk in manager.values_list('pk', flat=True).iterator() if pk not in keep_ids]
+            for start in range(0, len(remove_these_ones), self.batch_size):
+                queryset = manager.filter(pk__in=remove_these_ones[start:start + self.batch_size])
+                if verbosity >= 2:
+                    for obj in queryset:
+                        print("Deleted object: %s" % six.u(obj))
+                if delete_signals:
+                    queryset.delete()
+                else:
+                    queryset._raw_delete(queryset.db)
 
             if verbosity > 0 and remove_these_ones:
                 num_deleted = len(remove_these_ones)
@@ -60,24 +209,120 @@ class Command(BaseCommand):
 
                 print("Deleted %s %s" % (str(num_deleted), type_deleted))
 
+    def save_many_to_many(self, instance, m2m_data):
+        for accessor_name, object_list in m2m_data.items():
+            manager = getattr(instance, accessor_name)
+            if hasattr(manager, 'set'):
+                manager.set(object_list)
+            else:
+                setattr(instance, accessor_name, object_list)
+
+    def upsert_objects(self, objects, counts):
+        """
+        Saves a batch of deserialized objects of the same model. The objects
+        which are not in the database yet are created in bulk, the others are
+        only saved when their fields or many to many relations changed.
+        - counts: A map of the number of objects 'inserted', 'updated' and
+         'unchanged', which is updated for this batch.
+        """
+        model = objects[0].object.__class__
+        manager = model._default_manager
+        existing = manager.in_bulk([obj.object.pk for obj in objects if obj.object.pk is not None])
+
+        # Current related primary keys of the existing objects, by field name
+        existing_m2m = {}
+        for field in model._meta.many_to_many:
+            if not any(obj.m2m_data and field.name in obj.m2m_data for obj in objects):
+                continue
+            if hasattr(field, 'remote_field'):  # Django>=1.9
+                through = field.remote_field.through
+            else:
+                through = field.rel.through
+            source = through._meta.get_field(field.m2m_field_name()).attname
+            target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+            related = existing_m2m[field.name] = {}
+            queryset = through._default_manager.filter(**{'%s__in' % source: list(existing)})
+            for source_pk, target_pk in queryset.values_list(source, target):
+                related.setdefault(source_pk, set()).add(target_pk)
+
+        created = []
+        for obj in objects:
+            instance = obj.object
+            current = existing.get(instance.pk) if instance.pk is not None else None
+            if current is None:
+                counts['inserted'] += 1
+                # Multi-table inherited models can't be created in bulk
+                if instance.pk is None or model._meta.parents:
+                    obj.save()
+                else:
+                    created.append(obj)
+                continue
+
+            update_fields = [field.name for field in model._meta.concrete_fields
+                             if getattr(current, field.attname) != getattr(instance, field.attname)]
+            m2m_data = dict((name, object_list) for name, object_list in (obj.m2m_data or {}).items()
+                            if set(object_list) != existing_m2m[name].get(instance.pk, set()))
+            if update_fields:
+                obj.save(save_m2m=False, update_fields=update_fields)
+            if m2m_data:
+                self.save_many_to_many(instance, m2m_data)
+            if update_fields or m2m_data:
+                counts['updated'] += 1
+            else:
+                counts['unchanged'] += 1
+
+        if created:
+            manager.bulk_create([obj.object for obj in created])
+            for obj in created:
+                if obj.m2m_data:
+                    self.save_many_to_many(obj.object, obj.m2m_data)
+
+    def deserialize(self, format, fixture, flush=None):
+        """
+        Returns an iterator of the deserialized objects in fixture. The
+        objects of the streaming formats are deserialized while the fixture
+        is read.
+        - flush: When given it is called with a set of models before an
+         object referring to objects of those models by their natural key is
+         deserialized, so the objects which are not saved yet can be saved
+         first. For formats which are not read incrementally it is called
+         before every object with all models which are looked up by natural
+         key.
+        """
+        from django.core import serializers
+        from django.core.serializers.python import Deserializer as PythonDeserializer
+
+        if format in STREAMING_READERS:
+            items = STREAMING_READERS[format](fixture)
+            if flush is not None:
+                items = iter_flushed_items(items, flush)
+            return PythonDeserializer(items)
+        objects = serializers.deserialize(format, fixture)
+        if flush is not None:
+            objects = iter_flushed_objects(objects, flush)
+        return objects
+
     @signalcommand
     @transaction.atomic
-    def handle(self, *fixture_labels, **options):
+    def handle(self, *args, **options):
         """ Main method of a Django command """
-        from django.db.models import get_apps
+        from django.apps import apps
         from django.core import serializers
         from django.conf import settings
 
         self.style = no_style()
 
+        fixture_labels = options['fixture_labels']
         verbosity = int(options.get('verbosity', 1))
         show_traceback = options.get('traceback', False)
+        upsert = options.get('upsert', False)
 
         # Keep a count of the installed objects and fixtures
         fixture_count = 0
         object_count = 0
         objects_per_fixture = []
         models = set()
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
 
         humanize = lambda dirname: dirname and "'%s'" % dirname or 'absolute path'
 
@@ -86,15 +331,17 @@ class Command(BaseCommand):
         # it isn't already initialized).
         cursor = connection.cursor()
 
-        app_fixtures = [os.path.join(os.path.dirname(app.__file__), 'fixtures') for app in get_apps()]
+        app_fixtures = [os.path.join(app_config.path, 'fixtures') for app_config in apps.get_app_configs()]
+        public_formats = serializers.get_public_serializer_formats()
+        public_formats.extend(format for format in sorted(STREAMING_READERS) if format not in public_formats)
         for fixture_label in fixture_labels:
             parts = fixture_label.split('.')
             if len(parts) == 1:
                 fixture_name = fixture_label
-                formats = serializers.get_public_serializer_formats()
+                formats = public_formats
             else:
                 fixture_name, format = '.'.join(parts[:-1]), parts[-1]
-                if format in serializers.get_public_serializer_formats():
+                if format in public_formats:
                     formats = [format]
                 else:
                     formats = []
@@ -104,7 +351,7 @@ class Command(BaseCommand):
                     print("Loading '%s' fixtures..." % fixture_name)
             else:
                 sys.stderr.write(self.style.ERROR("Problem installing fixture '%s': %s is not a known serialization format." % (fixture_name, format)))
-                transaction.rollback()
+                transaction.set_rollback(True)
                 return
 
             if os.path.isabs(fixture_name):
@@ -126,7 +373,7 @@ class Command(BaseCommand):
                         if label_found:
                             fixture.close()
                             print(self.style.ERROR("Multiple fixtures named '%s' in %s. Aborting." % (fixture_name, humanize(fixture_dir))))
-                            transaction.rollback()
+                            transaction.set_rollback(True)
                             return
                         else:
                             fixture_count += 1
@@ -135,7 +382,16 @@ class Command(BaseCommand):
                                 print("Installing %s fixture '%s' from %s." % (format, fixture_name, humanize(fixture_dir)))
                             try:
                                 objects_to_keep = {}
-                                objects = serializers.deserialize(format, fixture)
+                                pending = []
+
+                                def flush(models=None):
+                                    # only objects of the models looked up by natural key need to be saved first
+                                    if pending and (models is None or issubclass(pending[0].object.__class__, tuple(models))):
+                                        self.upsert_objects(pending, counts)
+                                        objects_to_keep[pending[0].object.__class__].update(p.object.pk for p in pending)
+                                        del pending[:]
+
+                                objects = self.deserialize(format, fixture, flush if upsert else None)
                                 for obj in objects:
                                     object_count += 1
                                     objects_per_fixture[-1] += 1
@@ -143,13 +399,21 @@ class Command(BaseCommand):
                                     class_ = obj.object.__class__
                                     if class_ not in objects_to_keep:
                                         objects_to_keep[class_] = set()
-                                    objects_to_keep[class_].add(obj.object)
 
                                     models.add(class_)
-                                    obj.save()
+                                    if not upsert:
+                                        obj.save()
+                                        objects_to_keep[class_].add(obj.object.pk)
+                                        continue
+
+                                    # Batches hold consecutive objects of a model to keep the fixture order
+                                    if pending and (pending[0].object.__class__ is not class_ or len(pending) >= self.batch_size):
+                                        flush()
+                                    pending.append(obj)
+                                flush()
 
                                 if options.get('remove'):
-                                    self.remove_objects_not_in(objects_to_keep, verbosity)
+                                    self.remove_objects_not_in(objects_to_keep, verbosity, options.get('delete_signals', True))
 
                                 label_found = True
                             except (SystemExit, KeyboardInterrupt):
@@ -157,7 +421,7 @@ class Command(BaseCommand):
                             except Exception:
                                 import traceback
                                 fixture.close()
-                                transaction.rollback()
+                                transaction.set_rollback(True)
                                 if show_traceback:
                                     traceback.print_exc()
                                 else:
@@ -173,7 +437,7 @@ class Command(BaseCommand):
         if 0 in objects_per_fixture:
             sys.stderr.write(
                 self.style.ERROR("No fixture data found for '%s'. (File format may be invalid.)" % fixture_name))
-            transaction.rollback()
+            transaction.set_rollback(True)
             return
 
         # If we found even one object in a fixture, we need to reset the
@@ -186,17 +450,11 @@ class Command(BaseCommand):
                 for line in sequence_sql:
                     cursor.execute(line)
 
-        transaction.commit()
-
         if object_count == 0:
             if verbosity > 1:
                 print("No fixtures found.")
         else:
             if verbosity > 0:
                 print("Installed %d object(s) from %d fixture(s)" % (object_count, fixture_count))
-
-        # Close the DB connection. This is required as a workaround for an
-        # edge case in MySQL: if the same connection is used to
-        # create tables, load data, and query, the query can return
-        # incorrect results. See Django #7572, MySQL #37735.
-        connection.close()
+                if upsert:
+                    print("Inserted %(inserted)d, updated %(updated)d and left %(unchanged)d object(s) unchanged" % counts)
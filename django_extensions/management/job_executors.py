@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+django_extensions.management.job_executors
+
+Executors decide how runjobs executes the jobs it discovers. The inline
+executor runs them one after the other in the runjobs process, the other
+executors hand them off to worker processes.
+"""
+import importlib
+import time
+import traceback
+
+from django_extensions.management.jobs import JobError, my_import, run_job
+
+EXECUTORS = {
+    'inline': 'django_extensions.management.job_executors.InlineExecutor',
+    'multiprocessing': 'django_extensions.management.job_executors.MultiprocessingExecutor',
+    'database': 'django_extensions.management.job_executors.DatabaseExecutor',
+}
+
+_queue_models = {}
+
+
+def get_executor(name=None, **options):
+    """
+    Returns an executor instance. name is either one of the keys of EXECUTORS
+    or the dotted path to a BaseExecutor subclass and defaults to the
+    RUNJOBS_EXECUTOR setting.
+    """
+    if name is None:
+        from django.conf import settings
+        name = getattr(settings, 'RUNJOBS_EXECUTOR', 'inline')
+    path = EXECUTORS.get(name, name)
+    module_path, class_name = path.rsplit('.', 1)
+    try:
+        executor_class = getattr(importlib.import_module(module_path), class_name)
+    except (ImportError, AttributeError) as err:
+        raise JobError("Failed to load job executor %s with error %s" % (path, err))
+    return executor_class(**options)
+
+
+def execute_job(job_class, app_name, job_name, when=None):
+    """
+    Runs a job and prints the traceback of any error. Returns whether the job
+    succeeded.
+    """
+    try:
+        run_job(job_class())
+    except Exception:
+        if when:
+            print("ERROR OCCURED IN %s JOB: %s (APP: %s)" % (when.upper(), job_name, app_name))
+        else:
+            print("ERROR OCCURED IN JOB: %s (APP: %s)" % (job_name, app_name))
+        print("START TRACEBACK:")
+        traceback.print_exc()
+        print("END TRACEBACK\n")
+        return False
+    return True
+
+
+class BaseExecutor(object):
+    """
+    Base class for job executors.
+
+    submit() is called by runjobs for every job, wait() once all jobs are
+    submitted. Executors handing jobs off to a queue also implement work(),
+    which is run by the runjobs_worker command to consume that queue.
+    """
+
+    def __init__(self, verbosity=1, **options):
+        self.verbosity = verbosity
+
+    def submit(self, job_class, app_name, job_name, when=None):
+        raise NotImplementedError("Executor needs to implement the submit method")
+
+    def wait(self):
+        pass
+
+    def work(self, burst=False, sleep=1):
+        raise JobError("Executor %s does not use a worker" % self.__class__.__name__)
+
+    def create_table(self):
+        raise JobError("Executor %s does not use a table" % self.__class__.__name__)
+
+
+class InlineExecutor(BaseExecutor):
+    """ Runs every job directly in the current process. """
+
+    def submit(self, job_class, app_name, job_name, when=None):
+        execute_job(job_class, app_name, job_name, when)
+
+
+class MultiprocessingExecutor(BaseExecutor):
+    """
+    Runs every job in its own process, at most processes of them at the same
+    time. Unlike the workers of a multiprocessing pool these processes are not
+    daemonic, so they can supervise jobs with a timeout or max_memory.
+    """
+
+    def __init__(self, processes=None, **options):
+        import multiprocessing
+
+        super(MultiprocessingExecutor, self).__init__(**options)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.running = []
+
+    def reap(self, max_running):
+        """ Waits until at most max_running processes are running. """
+        while True:
+            self.running = [process for process in self.running if process.is_alive()]
+            if len(self.running) <= max_running:
+                return
+            self.running[0].join(0.1)
+
+    def submit(self, job_class, app_name, job_name, when=None):
+        import multiprocessing
+        from django.db import connections
+
+        self.reap(self.processes - 1)
+        # the job processes must not share database connections with us
+        connections.close_all()
+        process = multiprocessing.Process(target=execute_job, args=(job_class, app_name, job_name, when))
+        process.start()
+        self.running.append(process)
+
+    def wait(self):
+        self.reap(0)
+
+
+def get_queue_model(table):
+    """
+    Returns an unmanaged model for the job queue stored in table.
+    """
+    if table not in _queue_models:
+        from django.apps.registry import Apps
+        from django.db import models
+        from django.utils import timezone
+
+        class Meta:
+            app_label = 'django_extensions'
+            db_table = table
+            managed = False
+            # keep the model out of the project's app registry
+            apps = Apps([])
+
+        _queue_models[table] = type(str('QueuedJob_%s' % table), (models.Model,), {
+            '__module__': __name__,
+            'Meta': Meta,
+            'app_name': models.CharField(max_length=255),
+            'job_name': models.CharField(max_length=255),
+            'job_module': models.CharField(max_length=255),
+            'when': models.CharField(max_length=20, blank=True),
+            'created': models.DateTimeField(default=timezone.now),
+            'timeout': models.FloatField(null=True),
+            'started': models.DateTimeField(null=True, db_index=True),
+            'expires': models.DateTimeField(null=True, db_index=True),
+        })
+    return _queue_models[table]
+
+
+class DatabaseExecutor(BaseExecutor):
+    """
+    Stores the jobs in a database table from which they are consumed by
+    runjobs_worker processes, on any number of hosts.
+
+    The table is named by the RUNJOBS_QUEUE_TABLE setting and is created once
+    with runjobs_worker --create-table. On PostgreSQL workers claim jobs using
+    SELECT ... FOR UPDATE SKIP LOCKED, elsewhere with a conditional UPDATE.
+
+    A claimed job is never claimed again by default. When the
+    RUNJOBS_QUEUE_RECLAIM_AFTER setting is a number of seconds, a job with a
+    timeout is claimed again once that many seconds passed after its timeout,
+    as run_job stops the job at its timeout its worker must have crashed by
+    then. Jobs without a timeout are never claimed again.
+    """
+
+    def __init__(self, using=None, **options):
+        from django.conf import settings
+        from django.db import DEFAULT_DB_ALIAS
+
+        super(DatabaseExecutor, self).__init__(**options)
+        self.using = using or DEFAULT_DB_ALIAS
+        self.model = get_queue_model(getattr(settings, 'RUNJOBS_QUEUE_TABLE', 'django_extensions_job_queue'))
+        self.reclaim_after = getattr(settings, 'RUNJOBS_QUEUE_RECLAIM_AFTER', None)
+
+    def create_table(self):
+        """
+        Creates the queue table, returns False when it already exists.
+        """
+        from django.db import connections
+
+        connection = connections[self.using]
+        if self.model._meta.db_table in connection.introspection.table_names():
+            return False
+        with connection.schema_editor() as editor:
+            editor.create_model(self.model)
+        return True
+
+    def submit(self, job_class, app_name, job_name, when=None):
+        self.model.objects.using(self.using).create(
+            app_name=app_name, job_name=job_name, job_module=job_class.__module__, when=when or '',
+            timeout=job_class.timeout)
+
+    def claim(self):
+        """
+        Marks the oldest job which is not started yet, or whose claim
+        expired, as started and returns it, or returns None when the queue
+        is empty.
+        """
+        import datetime
+
+        from django.db import connections, transaction
+        from django.db.models import Q
+        from django.utils import timezone
+
+        connection = connections[self.using]
+        qn = connection.ops.quote_name
+        sql = "SELECT %s, %s FROM %s WHERE %s IS NULL" % (
+            qn('id'), qn('timeout'), qn(self.model._meta.db_table), qn('started'))
+        if self.reclaim_after is not None:
+            sql += " OR %s < %%s" % qn('expires')
+        sql += " ORDER BY %s" % qn('id')
+        if connection.vendor != 'oracle':
+            sql += " LIMIT 1"
+        if connection.vendor == 'postgresql':
+            sql += " FOR UPDATE SKIP LOCKED"
+
+        while True:
+            now = timezone.now()
+            unclaimed = Q(started=None)
+            params = []
+            if self.reclaim_after is not None:
+                unclaimed |= Q(expires__lt=now)
+                params.append(connection.ops.adapt_datetimefield_value(now))
+            with transaction.atomic(using=self.using):
+                cursor = connection.cursor()
+                cursor.execute(sql, params)
+                row = cursor.fetchone()
+                if row is None:
+                    return None
+                pk, timeout = row
+                expires = None
+                if self.reclaim_after is not None and timeout:
+                    expires = now + datetime.timedelta(seconds=timeout + self.reclaim_after)
+                queryset = self.model.objects.using(self.using).filter(unclaimed, pk=pk)
+                # another worker may have claimed the job on databases without row locks
+                if queryset.update(started=now, expires=expires):
+                    return self.model.objects.using(self.using).get(pk=pk)
+
+    def work(self, burst=False, sleep=1):
+        while True:
+            queued_job = self.claim()
+            if queued_job is None:
+                if burst:
+                    return
+                time.sleep(sleep)
+                continue
+            if self.verbosity > 1:
+                print("Executing %s job: %s (app: %s)" % (queued_job.when, queued_job.job_name, queued_job.app_name))
+            try:
+                job_class = my_import(queued_job.job_module).Job
+            except (JobError, AttributeError):
+                print("ERROR LOADING JOB: %s (APP: %s)" % (queued_job.job_name, queued_job.app_name))
+                traceback.print_exc()
+            else:
+                execute_job(job_class, queued_job.app_name, queued_job.job_name, queued_job.when)
+            queued_job.delete()
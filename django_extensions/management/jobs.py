@@ -4,10 +4,15 @@ django_extensions.management.jobs
 """
 
 import os
+import sys
+import time
 from imp import find_module
 
 _jobs = None
 
+# exit code used by a supervised job process which ran out of memory
+MEMORY_EXIT_CODE = 3
+
 
 def noneimplementation(meth):
     return None
@@ -20,6 +25,10 @@ class JobError(Exception):
 class BaseJob(object):
     help = "undefined job description."
     when = None
+    # maximum number of seconds the job is allowed to run
+    timeout = None
+    # maximum size of the address space of the job in bytes
+    max_memory = None
 
     def execute(self):
         raise NotImplementedError("Job needs to implement the execute method")
@@ -53,6 +62,130 @@ class YearlyJob(BaseJob):
     when = "yearly"
 
 
+class ChunkedJob(BaseJob):
+    """
+    Job which processes a queryset in chunks.
+
+    Rows are fetched in order of ``key_field`` using keyset pagination, rows
+    sharing a value of a non unique ``key_field`` are ordered by their primary
+    key. Each chunk is processed in its own transaction after which the key of
+    its last row is stored as checkpoint in the cache. An interrupted job
+    resumes from that checkpoint on its next run, which requires a cache shared
+    between processes: local memory and dummy caches are refused.
+    """
+    chunk_size = 1000
+    key_field = 'pk'
+    # seconds to sleep between two chunks
+    chunk_sleep = 0
+    checkpoint_cache = 'default'
+    # database alias of a replica to monitor and the maximum lag in seconds
+    # it is allowed to have before the job pauses
+    replica_database = None
+    max_replica_lag = None
+    replica_lag_sleep = 5
+
+    def get_queryset(self):
+        raise NotImplementedError("ChunkedJob needs to implement the get_queryset method")
+
+    def process_chunk(self, objects):
+        raise NotImplementedError("ChunkedJob needs to implement the process_chunk method")
+
+    def get_checkpoint_key(self):
+        return 'django_extensions.jobs.checkpoint.%s.%s' % (self.__class__.__module__, self.__class__.__name__)
+
+    def get_checkpoint_cache(self):
+        from django.core.cache import caches
+        from django.core.cache.backends.dummy import DummyCache
+        from django.core.cache.backends.locmem import LocMemCache
+
+        cache = caches[self.checkpoint_cache]
+        if isinstance(cache, (DummyCache, LocMemCache)):
+            raise JobError("Cache %s of job %s does not keep the checkpoint between runs, set checkpoint_cache "
+                           "to a cache shared between processes" % (self.checkpoint_cache, self.__class__.__name__))
+        return cache
+
+    def get_checkpoint(self):
+        return self.get_checkpoint_cache().get(self.get_checkpoint_key())
+
+    def set_checkpoint(self, value):
+        cache = self.get_checkpoint_cache()
+        if value is None:
+            cache.delete(self.get_checkpoint_key())
+        else:
+            cache.set(self.get_checkpoint_key(), value, None)
+
+    def get_replica_lag(self):
+        """
+        Returns the replication lag of replica_database in seconds or None
+        when it is unknown.
+        """
+        if not self.replica_database:
+            return None
+        from django.db import connections
+        connection = connections[self.replica_database]
+        cursor = connection.cursor()
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())")
+            row = cursor.fetchone()
+            return row[0] if row else None
+        if connection.vendor == 'mysql':
+            cursor.execute("SHOW SLAVE STATUS")
+            row = cursor.fetchone()
+            if not row:
+                return None
+            columns = [column[0] for column in cursor.description]
+            return dict(zip(columns, row)).get('Seconds_Behind_Master')
+        return None
+
+    def throttle(self):
+        if self.chunk_sleep:
+            time.sleep(self.chunk_sleep)
+        if self.max_replica_lag is None:
+            return
+        while True:
+            lag = self.get_replica_lag()
+            if lag is None or lag <= self.max_replica_lag:
+                return
+            time.sleep(self.replica_lag_sleep)
+
+    def execute(self):
+        from django.db import router, transaction
+        from django.db.models import Q
+
+        queryset = self.get_queryset()
+        opts = queryset.model._meta
+        # a non unique key is paginated on (key_field, pk), otherwise the
+        # rows sharing the key of the last row of a chunk would be skipped
+        unique = self.key_field == 'pk' or opts.get_field(self.key_field).unique
+        if unique:
+            queryset = queryset.order_by(self.key_field)
+        else:
+            queryset = queryset.order_by(self.key_field, 'pk')
+        using = router.db_for_write(queryset.model)
+        checkpoint = self.get_checkpoint()
+        while True:
+            chunk = queryset
+            if checkpoint is not None and unique:
+                chunk = chunk.filter(**{'%s__gt' % self.key_field: checkpoint})
+            elif checkpoint is not None:
+                key, pk = checkpoint
+                chunk = chunk.filter(Q(**{'%s__gt' % self.key_field: key}) | Q(**{self.key_field: key, 'pk__gt': pk}))
+            objects = list(chunk[:self.chunk_size])
+            if not objects:
+                break
+            with transaction.atomic(using=using):
+                self.process_chunk(objects)
+            checkpoint = getattr(objects[-1], self.key_field)
+            if not unique:
+                checkpoint = (checkpoint, objects[-1].pk)
+            self.set_checkpoint(checkpoint)
+            if len(objects) < self.chunk_size:
+                break
+            self.throttle()
+        # the run completed, so the next one starts from the beginning
+        self.set_checkpoint(None)
+
+
 def my_import(name):
     try:
         imp = __import__(name)
@@ -151,6 +284,46 @@ def get_job(app_name, job_name):
         raise KeyError("Job not found: %s" % job_name)
 
 
+def _execute_supervised(job):
+    if job.max_memory:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (job.max_memory, job.max_memory))
+    try:
+        job.execute()
+    except MemoryError:
+        sys.exit(MEMORY_EXIT_CODE)
+
+
+def run_job(job):
+    """
+    Executes a job instance.
+
+    Jobs which declare a timeout or max_memory are executed in a separate
+    process which is killed when it exceeds one of its limits, in which case
+    a JobError is raised.
+    """
+    if not job.timeout and not job.max_memory:
+        job.execute()
+        return
+
+    import multiprocessing
+    from django.db import connections
+
+    # the child process must not share database connections with us
+    connections.close_all()
+    process = multiprocessing.Process(target=_execute_supervised, args=(job,))
+    process.start()
+    process.join(job.timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        raise JobError("Job exceeded its timeout of %s seconds" % job.timeout)
+    if process.exitcode == MEMORY_EXIT_CODE:
+        raise JobError("Job exceeded its memory limit of %s bytes" % job.max_memory)
+    if process.exitcode:
+        raise JobError("Job exited with exit code %s" % process.exitcode)
+
+
 def print_jobs(when=None, only_scheduled=False, show_when=True, show_appname=False, show_header=True):
     jobmap = get_jobs(when, only_scheduled=only_scheduled)
     print("Job List: %i jobs" % len(jobmap))
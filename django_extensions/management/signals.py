@@ -12,5 +12,15 @@ run_weekly_jobs = Signal()
 run_monthly_jobs = Signal()
 run_yearly_jobs = Signal()
 
+JOB_SIGNALS = {
+    'minutely': run_minutely_jobs,
+    'quarter_hourly': run_quarter_hourly_jobs,
+    'hourly': run_hourly_jobs,
+    'daily': run_daily_jobs,
+    'weekly': run_weekly_jobs,
+    'monthly': run_monthly_jobs,
+    'yearly': run_yearly_jobs,
+}
+
 pre_command = Signal(providing_args=["args", "kwargs"])
 post_command = Signal(providing_args=["args", "kwargs", "outcome"])
@@ -1,12 +1,29 @@
 # -*- coding: utf-8 -*-
 import ast
+import multiprocessing.pool
 import sys
 
 import six
-from django.core.management import call_command
-from django.test import TestCase
+from django.apps.registry import Apps
+from django.core.management import CommandError, call_command
+from django.db import connection, models
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
-from .testapp.models import Name, Note, Person
+from django_extensions.management.commands.dumpscript import sort_models
+
+from . import mock
+from .testapp.models import ChildSluggedTestModel, Name, Note, Person, SluggedTestModel, SluggedTestModelReference
+
+
+class RecordingPool(multiprocessing.pool.Pool):
+    """ Keeps the tasks given to imap """
+    tasks = []
+
+    def imap(self, func, iterable, chunksize=1):
+        iterable = list(iterable)
+        RecordingPool.tasks.extend(iterable)
+        return super(RecordingPool, self).imap(func, iterable, chunksize)
 
 
 class DumpScriptTests(TestCase):
@@ -67,3 +84,197 @@ class DumpScriptTests(TestCase):
         else:
             self.assertTrue(len(ast_syntax_tree.asList()) > 1)
         tmp_out.close()
+
+    def test_stream(self):
+        n1 = Name(name='John')
+        n1.save()
+        p1 = Person(name=n1, age=40)
+        p1.save()
+        note1 = Note(note="This is the first note.")
+        note1.save()
+        p1.notes.add(note1)
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', stdout=tmp_out)
+        stream_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', stream=True, stdout=stream_out)
+        ast.parse(stream_out.getvalue())
+        self.assertEqual(tmp_out.getvalue().strip(), stream_out.getvalue().strip())
+        tmp_out.close()
+        stream_out.close()
+
+    def test_queries_per_model(self):
+        def dumpscript_queries():
+            with CaptureQueriesContext(connection) as queries:
+                call_command('dumpscript', 'django_extensions', stdout=six.StringIO())
+            return len(queries)
+
+        note = Note.objects.create(note="A note")
+        for age in range(2):
+            Person.objects.create(name=Name.objects.create(name='Person %d' % age), age=age).notes.add(note)
+        num_queries = dumpscript_queries()
+
+        for age in range(2, 10):
+            Person.objects.create(name=Name.objects.create(name='Person %d' % age), age=age).notes.add(note)
+        self.assertEqual(num_queries, dumpscript_queries())
+
+    def test_inheritance(self):
+        SluggedTestModel.objects.create(title='parent')
+        ChildSluggedTestModel.objects.create(title='child')
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', stdout=tmp_out)
+        # the parent of the subclassed instance is created through it
+        self.assertEqual(1, tmp_out.getvalue().count('= SluggedTestModel()'))
+
+        ChildSluggedTestModel.objects.all().delete()
+        SluggedTestModel.objects.all().delete()
+        script = {}
+        six.exec_(compile(tmp_out.getvalue(), 'dumpscript', 'exec'), script)
+        script['run']()
+        self.assertEqual(['child', 'parent'], sorted(SluggedTestModel.objects.values_list('title', flat=True)))
+        self.assertEqual(['child'], list(ChildSluggedTestModel.objects.values_list('title', flat=True)))
+
+    def test_reference_to_skipped_parent(self):
+        # the referring model is defined before the subclassed model
+        child = ChildSluggedTestModel.objects.create(title='child')
+        SluggedTestModelReference.objects.create(slugged=child.sluggedtestmodel_ptr)
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', stdout=tmp_out)
+        self.assertIn('django_extensions_sluggedtestmodelreference_1.slugged = django_extensions_childsluggedtestmodel_1', tmp_out.getvalue())
+
+        SluggedTestModelReference.objects.all().delete()
+        ChildSluggedTestModel.objects.all().delete()
+        SluggedTestModel.objects.all().delete()
+        script = {}
+        six.exec_(compile(tmp_out.getvalue(), 'dumpscript', 'exec'), script)
+        script['run']()
+        self.assertEqual(['child'], [reference.slugged.title for reference in SluggedTestModelReference.objects.all()])
+
+    def test_bulk(self):
+        n1 = Name.objects.create(name='John')
+        n2 = Name.objects.create(name='Jane')
+        p1 = Person.objects.create(name=n1, age=40)
+        p2 = Person.objects.create(name=n2, age=18)
+        p2.children.add(p1)
+        note = Note.objects.create(note="This is the first note.")
+        p2.notes.add(note)
+        ChildSluggedTestModel.objects.create(title='child')
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', bulk=True, batch_size=1, stdout=tmp_out)
+        self.assertEqual(2, tmp_out.getvalue().count('importer.bulk_create(Person, ['))
+
+        for model in (Person, Name, Note, ChildSluggedTestModel, SluggedTestModel):
+            model.objects.all().delete()
+        script = {}
+        six.exec_(compile(tmp_out.getvalue(), 'dumpscript', 'exec'), script)
+        script['run']()
+        self.assertEqual([(n1.pk, 'John'), (n2.pk, 'Jane')], list(Name.objects.order_by('pk').values_list('pk', 'name')))
+        self.assertEqual([p1], list(Person.objects.get(pk=p2.pk).children.all()))
+        self.assertEqual([note], list(Person.objects.get(pk=p2.pk).notes.all()))
+        self.assertEqual(['child'], list(ChildSluggedTestModel.objects.values_list('title', flat=True)))
+
+    def test_filter(self):
+        john = Person.objects.create(name=Name.objects.create(name='John'), age=40)
+        jane = Person.objects.create(name=Name.objects.create(name='Jane'), age=18)
+        Person.objects.create(name=Name.objects.create(name='Mike'), age=20)
+        Name.objects.create(name='Fred')
+        john.children.add(jane)
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', filters=['django_extensions.Person:age__gte=30'], stdout=tmp_out)
+        ast.parse(tmp_out.getvalue())
+        # the person, the one it refers to and their names
+        self.assertEqual(2, tmp_out.getvalue().count('= Person()'))
+        self.assertIn("'Jane'", tmp_out.getvalue())
+        self.assertNotIn("'Mike'", tmp_out.getvalue())
+        self.assertNotIn("'Fred'", tmp_out.getvalue())
+
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', sample=1, stdout=tmp_out)
+        self.assertEqual(2, tmp_out.getvalue().count('= Person()'))
+        self.assertEqual(2, tmp_out.getvalue().count('= Name()'))
+
+    def test_filter_lookups(self):
+        for name, age in (('John', 40), ('Jane', 18), ('Mike', 20), ('Fred', 40)):
+            Person.objects.create(name=Name.objects.create(name=name), age=age)
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', stdout=tmp_out, filters=[
+            'django_extensions.Person:age__gte=20&name__name__in=John,Mike,Jane'])
+        self.assertIn("'John'", tmp_out.getvalue())
+        self.assertIn("'Mike'", tmp_out.getvalue())
+        self.assertNotIn("'Jane'", tmp_out.getvalue())
+        self.assertNotIn("'Fred'", tmp_out.getvalue())
+
+    def test_self_m2m_depth(self):
+        people = [Person.objects.create(name=Name.objects.create(name='Person %d' % i), age=i) for i in range(4)]
+        for person, child in zip(people, people[1:]):
+            person.children.add(child)
+
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', filters=['django_extensions.Person:age=0'], stdout=tmp_out)
+        ast.parse(tmp_out.getvalue())
+        self.assertEqual(2, tmp_out.getvalue().count('= Person()'))
+        self.assertNotIn("'Person 2'", tmp_out.getvalue())
+        # the link to the person who is not exported is left out
+        self.assertEqual(1, tmp_out.getvalue().count('.children.add('))
+
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', filters=['django_extensions.Person:age=0'], self_m2m_depth=2,
+                     stdout=tmp_out)
+        self.assertEqual(3, tmp_out.getvalue().count('= Person()'))
+        self.assertNotIn("'Person 3'", tmp_out.getvalue())
+
+    def test_invalid_filter(self):
+        with self.assertRaises(CommandError):
+            call_command('dumpscript', 'django_extensions', filters=['django_extensions.Person'])
+
+
+class DumpScriptJobsTests(TransactionTestCase):
+    # the worker processes use database connections of their own
+
+    def test_jobs(self):
+        n1 = Name.objects.create(name='John')
+        p1 = Person.objects.create(name=n1, age=40)
+        p2 = Person.objects.create(name=Name.objects.create(name='Jane'), age=18)
+        p2.children.add(p1)
+        p2.notes.add(Note.objects.create(note="This is the first note."))
+        child = ChildSluggedTestModel.objects.create(title='child')
+        SluggedTestModelReference.objects.create(slugged=child.sluggedtestmodel_ptr)
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', stdout=tmp_out, stderr=six.StringIO())
+        jobs_out = six.StringIO()
+        del RecordingPool.tasks[:]
+        with mock.patch('multiprocessing.Pool', RecordingPool):
+            call_command('dumpscript', 'django_extensions', jobs=2, stdout=jobs_out, stderr=six.StringIO())
+        self.assertEqual(tmp_out.getvalue(), jobs_out.getvalue())
+        self.assertIn('django_extensions_sluggedtestmodelreference_1.slugged = django_extensions_childsluggedtestmodel_1', jobs_out.getvalue())
+
+        # the task of a model only carries the names of the instances it refers to
+        tasks = dict(RecordingPool.tasks)
+        self.assertEqual(tasks[('django_extensions', 'Name')], {})
+        self.assertEqual(set(tasks[('django_extensions', 'SluggedTestModelReference')].values()),
+                         set([None, 'django_extensions_childsluggedtestmodel_1']))
+
+        tmp_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', bulk=True, stdout=tmp_out, stderr=six.StringIO())
+        jobs_out = six.StringIO()
+        call_command('dumpscript', 'django_extensions', bulk=True, jobs=2, stdout=jobs_out, stderr=six.StringIO())
+        self.assertEqual(tmp_out.getvalue(), jobs_out.getvalue())
+
+
+class SortModelsTests(TestCase):
+    def test_cycles(self):
+        registry = Apps([])
+
+        def create_model(name, **fields):
+            meta = type(str('Meta'), (), {'app_label': 'django_extensions', 'apps': registry})
+            fields.update(__module__=__name__, Meta=meta)
+            return type(str(name), (models.Model, ), fields)
+
+        a = create_model('A')
+        b = create_model('B', a=models.ForeignKey(a, on_delete=models.CASCADE))
+        c = create_model('C', b=models.ForeignKey(b, on_delete=models.CASCADE), d=models.ForeignKey('D', on_delete=models.CASCADE))
+        d = create_model('D', c=models.ForeignKey(c, on_delete=models.CASCADE), d=models.ForeignKey('D', null=True, on_delete=models.CASCADE))
+        e = create_model('E', d=models.ManyToManyField(d))
+
+        sorted_models, cycles = sort_models([e, d, c, b, a], set([a, b, c, d, e]))
+        self.assertEqual([a, b, d, c, e], sorted_models)
+        self.assertEqual([[d, c]], cycles)
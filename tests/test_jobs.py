@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+import datetime
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import six
+from django.apps import apps
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from django_extensions.jobs.daily import cache_cleanup
+from django_extensions.management import signals
+from django_extensions.management.job_executors import DatabaseExecutor, MultiprocessingExecutor, get_executor
+from django_extensions.management.commands.runjobs import Command as RunJobsCommand
+
+from django_extensions.management.jobs import BaseJob, ChunkedJob, JobError, run_job
+
+from . import mock
+from .testapp.models import Name
+
+
+class SleepingJob(BaseJob):
+    timeout = 0.5
+
+    def execute(self):
+        time.sleep(10)
+
+
+class HungryJob(BaseJob):
+    max_memory = 256 * 1024 * 1024
+
+    def execute(self):
+        ' ' * (1024 * 1024 * 1024)
+
+
+class FailingJob(BaseJob):
+    timeout = 10
+
+    def execute(self):
+        raise ValueError("failed")
+
+
+class QuickJob(BaseJob):
+    timeout = 10
+
+    def execute(self):
+        pass
+
+
+class TouchJob(BaseJob):
+    timeout = 10
+    path = None
+
+    def execute(self):
+        with open(self.path, 'a') as f:
+            f.write('done\n')
+
+
+class RunJobTests(SimpleTestCase):
+    def test_timeout(self):
+        start = time.time()
+        with self.assertRaisesRegexp(JobError, 'timeout'):
+            run_job(SleepingJob())
+        self.assertLess(time.time() - start, 5)
+
+    def test_max_memory(self):
+        with self.assertRaisesRegexp(JobError, 'memory limit'):
+            run_job(HungryJob())
+
+    def test_failing_job(self):
+        with self.assertRaisesRegexp(JobError, 'exit code 1'):
+            run_job(FailingJob())
+
+    def test_quick_job(self):
+        run_job(QuickJob())
+
+
+class JobInterrupted(Exception):
+    pass
+
+
+class UppercaseNamesJob(ChunkedJob):
+    chunk_size = 2
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.chunks = []
+
+    def get_queryset(self):
+        return Name.objects.all()
+
+    def process_chunk(self, objects):
+        if self.fail_after is not None and len(self.chunks) == self.fail_after:
+            raise JobInterrupted()
+        self.chunks.append([obj.name for obj in objects])
+        for obj in objects:
+            obj.name = obj.name.upper()
+            obj.save()
+
+
+class NamesByNameJob(ChunkedJob):
+    chunk_size = 2
+    key_field = 'name'
+
+    def __init__(self):
+        self.chunks = []
+
+    def get_queryset(self):
+        return Name.objects.all()
+
+    def process_chunk(self, objects):
+        self.chunks.append([obj.pk for obj in objects])
+
+
+@override_settings(
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'test_chunked_job',
+    }},
+)
+class ChunkedJobTests(TestCase):
+    def setUp(self):
+        call_command('createcachetable')
+        for name in ('a', 'b', 'c', 'd', 'e'):
+            Name.objects.create(name=name)
+
+    def test_processes_all_rows_in_chunks(self):
+        job = UppercaseNamesJob()
+        job.execute()
+        self.assertEqual(job.chunks, [['a', 'b'], ['c', 'd'], ['e']])
+        self.assertIsNone(job.get_checkpoint())
+        self.assertEqual(sorted(Name.objects.values_list('name', flat=True)), ['A', 'B', 'C', 'D', 'E'])
+
+    def test_resumes_from_checkpoint(self):
+        job = UppercaseNamesJob(fail_after=1)
+        with self.assertRaises(JobInterrupted):
+            job.execute()
+        self.assertEqual(job.chunks, [['a', 'b']])
+        self.assertEqual(sorted(Name.objects.values_list('name', flat=True)), ['A', 'B', 'c', 'd', 'e'])
+
+        job = UppercaseNamesJob()
+        job.execute()
+        self.assertEqual(job.chunks, [['c', 'd'], ['e']])
+
+    def test_non_unique_key_field(self):
+        Name.objects.all().delete()
+        names = [Name.objects.create(name=name) for name in ('a', 'b', 'b', 'b', 'c')]
+        job = NamesByNameJob()
+        job.execute()
+        self.assertEqual(job.chunks, [[names[0].pk, names[1].pk], [names[2].pk, names[3].pk], [names[4].pk]])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_refuses_local_cache(self):
+        job = UppercaseNamesJob()
+        with self.assertRaisesRegexp(JobError, 'checkpoint'):
+            job.execute()
+        self.assertEqual(job.chunks, [])
+
+
+@override_settings(
+    CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'test_cache_cleanup',
+    }},
+    CACHE_CLEANUP_BATCH_SIZE=3,
+)
+class CacheCleanupJobTests(TestCase):
+    def setUp(self):
+        call_command('createcachetable')
+        self.cache = caches['default']
+
+    def count_entries(self):
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM test_cache_cleanup")
+        return cursor.fetchone()[0]
+
+    def test_deletes_expired_entries_in_batches(self):
+        for i in range(7):
+            self.cache.set('expired-%d' % i, i, -1)
+        self.cache.set('fresh', 'value', 3600)
+        self.assertEqual(self.count_entries(), 8)
+
+        job = cache_cleanup.Job()
+        with CaptureQueriesContext(connection) as queries:
+            job.execute()
+        self.assertEqual(self.count_entries(), 1)
+        self.assertEqual(self.cache.get('fresh'), 'value')
+        # the expired entries are found by the expires index, not sorted by key
+        selects = [query['sql'] for query in queries.captured_queries if 'expires <' in query['sql']]
+        self.assertEqual(len(selects), 6)
+        self.assertFalse([sql for sql in selects if 'ORDER BY' in sql.upper()])
+
+    def test_culls_entries_in_batches(self):
+        for i in range(10):
+            self.cache.set('key-%d' % i, i, 3600)
+
+        cache_options = {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_cache_cleanup'}
+        with override_settings(CACHES={'default': dict(cache_options, OPTIONS={'MAX_ENTRIES': 10})}):
+            cache_cleanup.Job().execute()
+        self.assertEqual(self.count_entries(), 10)
+
+        # 1 / CULL_FREQUENCY of MAX_ENTRIES is deleted, in order of the keys
+        with override_settings(CACHES={'default': dict(cache_options, OPTIONS={'MAX_ENTRIES': 8, 'CULL_FREQUENCY': 2})}):
+            with CaptureQueriesContext(connection) as queries:
+                cache_cleanup.Job().execute()
+        self.assertEqual(self.count_entries(), 6)
+        self.assertIsNone(self.cache.get('key-0'))
+        self.assertEqual(self.cache.get('key-4'), 4)
+        self.assertFalse([query for query in queries.captured_queries if 'COUNT' in query['sql'].upper()])
+        # later batches continue after the last key instead of sorting again
+        selects = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].upper().startswith('SELECT CACHE_KEY') and 'ORDER BY' in query['sql'].upper() and
+                   'LIMIT 1 ' not in query['sql'].upper()]
+        self.assertEqual(len(selects), 2)
+        self.assertNotIn("cache_key >", selects[0])
+        self.assertIn("cache_key >", selects[1])
+        self.assertIn("key-2", selects[1])
+
+        with override_settings(CACHES={'default': dict(cache_options, OPTIONS={'MAX_ENTRIES': 5, 'CULL_FREQUENCY': 0})}):
+            cache_cleanup.Job().execute()
+        self.assertEqual(self.count_entries(), 0)
+
+
+class CacheCleanupThreadsTests(TransactionTestCase):
+    def test_failing_cache_fails_the_job(self):
+        cache_options = {'BACKEND': 'django.core.cache.backends.db.DatabaseCache'}
+        with override_settings(CACHES={
+            'default': dict(cache_options, LOCATION='test_cache_cleanup'),
+            'missing': dict(cache_options, LOCATION='test_cache_cleanup_missing'),
+        }):
+            call_command('createcachetable', 'test_cache_cleanup')
+            cache = caches['default']
+            cache.set('expired', 'value', -1)
+            with self.assertRaises(DatabaseError):
+                cache_cleanup.Job().execute()
+            # the other cache is still cleaned up
+            cursor = connection.cursor()
+            cursor.execute("SELECT COUNT(*) FROM test_cache_cleanup")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class RunJobsBySignalsTests(SimpleTestCase):
+    def test_sends_signal_of_schedule(self):
+        received = []
+
+        def receiver(sender, app, **kwargs):
+            received.append(app.__name__)
+
+        signals.run_weekly_jobs.connect(receiver)
+        try:
+            RunJobsCommand().runjobs_by_signals('weekly', {})
+        finally:
+            signals.run_weekly_jobs.disconnect(receiver)
+        self.assertIn('tests.testapp.models', received)
+
+    def test_import_errors_of_declared_modules(self):
+        app_config = apps.get_app_config('testapp')
+        app_config.job_signals_module = 'tests.testapp.no_such_module'
+        try:
+            with self.assertRaises(ImportError):
+                RunJobsCommand().runjobs_by_signals('weekly', {})
+        finally:
+            del app_config.job_signals_module
+
+    def test_ignores_import_errors_of_management_packages(self):
+        import_module = importlib.import_module
+
+        def failing_import(name, package=None):
+            if name == 'django_extensions.management':
+                raise ImportError("No module named 'missing_dependency'")
+            return import_module(name, package)
+
+        stdout = sys.stdout
+        sys.stdout = six.StringIO()
+        try:
+            with mock.patch('importlib.import_module', side_effect=failing_import):
+                RunJobsCommand().runjobs_by_signals('yearly', {'verbosity': 2})
+            self.assertIn("Failed to import django_extensions.management: No module named 'missing_dependency'",
+                          sys.stdout.getvalue())
+        finally:
+            sys.stdout = stdout
+
+    def test_skips_signal_without_receivers(self):
+        self.assertFalse(signals.run_yearly_jobs.has_listeners())
+        stdout = sys.stdout
+        sys.stdout = six.StringIO()
+        try:
+            RunJobsCommand().runjobs_by_signals('yearly', {'verbosity': 2})
+            self.assertEqual(sys.stdout.getvalue(), '')
+        finally:
+            sys.stdout = stdout
+
+
+class MultiprocessingExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        TouchJob.path = os.path.join(self.tmpdir, 'touched')
+
+    def tearDown(self):
+        TouchJob.path = None
+        shutil.rmtree(self.tmpdir)
+
+    def test_runs_jobs_with_limits(self):
+        # jobs with a timeout are supervised from a process of their own
+        executor = MultiprocessingExecutor(processes=2)
+        for i in range(3):
+            executor.submit(TouchJob, 'tests.testapp', 'touch')
+        executor.wait()
+        with open(TouchJob.path) as f:
+            self.assertEqual(f.read(), 'done\n' * 3)
+        self.assertEqual(executor.running, [])
+
+
+class DatabaseExecutorTests(TestCase):
+    def setUp(self):
+        call_command('runjobs_worker', executor='database', create_table=True, verbosity=0)
+
+    def test_create_table(self):
+        executor = DatabaseExecutor()
+        self.assertIn(executor.model._meta.db_table, connection.introspection.table_names())
+        self.assertFalse(executor.create_table())
+
+    def test_queued_jobs_are_run_by_worker(self):
+        executor = DatabaseExecutor()
+        executor.submit(cache_cleanup.Job, 'django_extensions', 'cache_cleanup', 'daily')
+        self.assertEqual(executor.model.objects.count(), 1)
+
+        queued_job = executor.claim()
+        self.assertEqual(queued_job.job_module, 'django_extensions.jobs.daily.cache_cleanup')
+        self.assertIsNotNone(queued_job.started)
+        self.assertIsNone(executor.claim())
+        queued_job.started = None
+        queued_job.save()
+
+        call_command('runjobs_worker', executor='database', burst=True)
+        self.assertEqual(executor.model.objects.count(), 0)
+
+    def test_does_not_reclaim_jobs_by_default(self):
+        executor = DatabaseExecutor()
+        executor.submit(TouchJob, 'tests.testapp', 'touch')
+        queued_job = executor.claim()
+        self.assertIsNone(queued_job.expires)
+
+        executor.model.objects.filter(pk=queued_job.pk).update(started=timezone.now() - datetime.timedelta(days=1))
+        self.assertIsNone(executor.claim())
+
+    @override_settings(RUNJOBS_QUEUE_RECLAIM_AFTER=60)
+    def test_reclaims_jobs_after_their_timeout(self):
+        executor = DatabaseExecutor()
+        executor.submit(cache_cleanup.Job, 'django_extensions', 'cache_cleanup', 'daily')
+        executor.submit(TouchJob, 'tests.testapp', 'touch')
+        without_timeout = executor.claim()
+        with_timeout = executor.claim()
+        self.assertIsNone(without_timeout.expires)
+        # the lease of a job ends reclaim_after seconds after its timeout
+        self.assertEqual(with_timeout.expires - with_timeout.started, datetime.timedelta(seconds=70))
+        self.assertIsNone(executor.claim())
+
+        executor.model.objects.update(
+            started=timezone.now() - datetime.timedelta(days=1),
+            expires=timezone.now() - datetime.timedelta(seconds=1))
+        executor.model.objects.filter(pk=without_timeout.pk).update(expires=None)
+        self.assertEqual(executor.claim().pk, with_timeout.pk)
+        self.assertIsNone(executor.claim())
+
+    def test_unknown_executor(self):
+        with self.assertRaises(JobError):
+            get_executor('no.such.Executor')
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import sys
+import tempfile
+from unittest import skipUnless
+
+import six
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import TestCase
+
+from django_extensions.management.commands.sqldiff import Command as SqlDiffCommand
+
+
+class SqlDiffTests(TestCase):
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = six.StringIO()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.tmpdir)
+
+    def test_json_output(self):
+        call_command('sqldiff', all_applications=True, output='json')
+        data = json.loads(sys.stdout.getvalue())
+        # other tests register models without tables, only look at the testapp
+        data = [model for model in data if model['app_label'] == 'testapp_with_no_models_file']
+        self.assertEqual(data, [{
+            'app_label': 'testapp_with_no_models_file',
+            'model': 'TeslaCar',
+            'differences': [{
+                'type': 'table-missing-in-db',
+                'args': ['testapp_with_no_models_file_teslacar'],
+            }],
+        }])
+
+    def test_against_snapshot(self):
+        filename = os.path.join(self.tmpdir, 'schema.json')
+        call_command('sqldiff', all_applications=True, save_snapshot=filename)
+        live_output = sys.stdout.getvalue()
+        with open(filename) as f:
+            snapshot = json.load(f)
+        self.assertIn('auth_user', snapshot['tables'])
+
+        sys.stdout = six.StringIO()
+        call_command('sqldiff', all_applications=True, against_snapshot=filename)
+        self.assertEqual(sys.stdout.getvalue(), live_output)
+
+    def test_group_alter_table(self):
+        class GroupingSQLDiff(SqlDiffCommand().get_sqldiff_class(DEFAULT_DB_ALIAS)):
+            can_group_alter_table = True
+
+        sqldiff = GroupingSQLDiff([], {})
+        before, statements, after = sqldiff.get_sql_statements(no_style(), sqldiff.connection.ops.quote_name, [
+            ('index-missing-in-model', ('t', 'a', 'idx', '')),
+            ('field-missing-in-db', ('t', 'b', 'integer', 'NULL')),
+            ('index-missing-in-db', ('t', 'b', 'idx', '')),
+            ('field-missing-in-model', ('t', 'c')),
+            ('table-missing-in-db', ('u', )),
+        ])
+        self.assertEqual(before, [])
+        self.assertEqual(statements, [
+            'DROP INDEX "t_a_idx";',
+            'ALTER TABLE "t"\n\tADD COLUMN "b" integer NULL,\n\tDROP COLUMN "c";',
+            'CREATE INDEX "t_b_idx"\n\tON "t" ("b");',
+            '-- Table missing: u',
+        ])
+        self.assertEqual(after, [])
+
+    def test_performance_advisories(self):
+        call_command('sqldiff', 'admin', 'auth', performance=True, output='json')
+        data = dict((model['model'], model) for model in json.loads(sys.stdout.getvalue()))
+        self.assertEqual(data['LogEntry']['differences'], [])
+        self.assertEqual(data['LogEntry']['advisories'], [{
+            'type': 'ordering-index-missing',
+            'args': ['django_admin_log', 'action_time', 'ordering'],
+        }])
+        self.assertEqual([advisory['type'] for advisory in data['User_groups']['advisories']], ['index-redundant'])
+        self.assertNotIn('User', data)
+
+    def test_emit_migration(self):
+        from django.contrib.auth.models import Group
+        from django.db import connection
+        from django.db.migrations.loader import MigrationLoader
+
+        # let the database drift from the model
+        old_field = Group._meta.get_field('name')
+        new_field = old_field.clone()
+        new_field.set_attributes_from_name('name')
+        new_field.null = True
+        with connection.schema_editor() as editor:
+            editor.alter_field(Group, old_field, new_field)
+
+        call_command('sqldiff', 'auth', emit_migration='auth')
+        namespace = {}
+        exec(sys.stdout.getvalue(), namespace)
+        migration = namespace['Migration']('0009_sqldiff', 'auth')
+        self.assertIn(('auth', '0008_alter_user_username_max_length'), migration.dependencies)
+
+        state = MigrationLoader(None).project_state(('auth', '0008_alter_user_username_max_length'))
+        with connection.schema_editor() as editor:
+            migration.apply(state.clone(), editor)
+        sys.stdout = six.StringIO()
+        call_command('sqldiff', 'auth', output='json')
+        self.assertEqual(json.loads(sys.stdout.getvalue()), [])
+
+        with connection.schema_editor() as editor:
+            migration.unapply(state.clone(), editor)
+        sys.stdout = six.StringIO()
+        call_command('sqldiff', 'auth', output='json')
+        self.assertEqual(json.loads(sys.stdout.getvalue())[0]['differences'], [
+            {'type': 'notnull-differ', 'args': ['auth_group', 'name', 'SET']},
+        ])
+
+
+class SqlDiffTargetsTests(TestCase):
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = six.StringIO()
+        # a second alias of the test database, its connections are outside the test transaction
+        connections.databases['other'] = dict(connections.databases[DEFAULT_DB_ALIAS])
+        self.addCleanup(self.remove_other_database)
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def remove_other_database(self):
+        connections['other'].close()
+        del connections['other']
+        del connections.databases['other']
+
+    def sqldiff(self, *args, **options):
+        command = SqlDiffCommand()
+        sys.stdout = six.StringIO()
+        call_command(command, *args, **options)
+        return command.exit_code, sys.stdout.getvalue()
+
+    def test_databases(self):
+        exit_code, output = self.sqldiff('auth', databases=['default', 'other'], parallel=2, output='text')
+        self.assertEqual(exit_code, 0)
+        self.assertIn("# Target: default\n", output)
+        self.assertIn("# Target: other\n", output)
+        self.assertIn("# No differences in any target", output)
+
+        # a single drifting target makes the run fail
+        exit_code, output = self.sqldiff('auth', 'testapp_with_no_models_file', databases=['default', 'other'])
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(output.count("-- Table missing: testapp_with_no_models_file_teslacar"), 2)
+        self.assertIn("-- Targets with differences: default, other", output)
+
+    @skipUnless(connection.vendor == 'postgresql', "Schemas are only compared on PostgreSQL")
+    def test_schemas(self):
+        # created outside the test transaction, so sqldiff's connections see it
+        cursor = connections['other'].cursor()
+        cursor.execute("CREATE SCHEMA sqldiff_empty")
+        self.addCleanup(cursor.execute, "DROP SCHEMA sqldiff_empty")
+
+        exit_code, output = self.sqldiff('auth', schemas=['public', 'sqldiff_empty'], output='json')
+        data = json.loads(output)
+        self.assertEqual(exit_code, 1)
+        self.assertEqual(sorted(data), ['default.public', 'default.sqldiff_empty'])
+        self.assertEqual(data['default.public'], [])
+        self.assertIn({'type': 'table-missing-in-db', 'args': ['auth_user']},
+                      [difference for model in data['default.sqldiff_empty'] for difference in model['differences']])
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+
+import pytest
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from . import mock
+
+try:
+    import boto.s3.key
+    from django_extensions.management.commands.sync_s3 import Command
+    boto_active = True
+except ImportError:
+    boto_active = False
+
+
+@pytest.mark.skipif(boto_active is False, reason="boto is not installed")
+class SyncS3Tests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        os.mkdir(os.path.join(self.media_root, 'css'))
+        with open(os.path.join(self.media_root, 'css', 'site.css'), 'w') as f:
+            f.write('body { color: black; }\n' * 100)
+        for i in range(20):
+            with open(os.path.join(self.media_root, 'file%02d.txt' % i), 'w') as f:
+                f.write('file %d' % i)
+
+        self.bucket = mock.MagicMock()
+        self.bucket.list.return_value = []
+        self.uploads = []
+
+        def open_s3(command):
+            return self.bucket, boto.s3.key.Key(self.bucket)
+
+        def set_contents_from_string(key, filedata, headers, replace, policy):
+            self.uploads.append((key.name, id(key), threading.current_thread().ident))
+
+        settings = override_settings(
+            AWS_ACCESS_KEY_ID='access', AWS_SECRET_ACCESS_KEY='secret',
+            AWS_BUCKET_NAME='bucket', MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for patcher in [
+            mock.patch.object(Command, 'open_s3', autospec=True, side_effect=open_s3),
+            mock.patch.object(boto.s3.key.Key, 'set_contents_from_string', autospec=True,
+                              side_effect=set_contents_from_string),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def sync_s3(self, **options):
+        command = Command()
+        with mock.patch('sys.stdout', new_callable=StringIO) as stdout:
+            call_command(command, media_only=True, **options)
+        return command, stdout.getvalue()
+
+    def test_concurrency(self):
+        serial, serial_output = self.sync_s3(concurrency=1, verbosity=2)
+        serial_uploads = self.uploads[:]
+        del self.uploads[:]
+        threaded, threaded_output = self.sync_s3(concurrency=4, verbosity=2)
+
+        self.assertEqual(serial_output, threaded_output)
+        self.assertEqual(serial.uploaded_files, threaded.uploaded_files)
+        self.assertEqual(threaded.upload_count, 21)
+        self.assertEqual(len(threaded.uploaded_files), 21)
+        self.assertEqual(threaded.skip_count, 0)
+        self.assertEqual(sorted(name for name, _, _ in serial_uploads),
+                         sorted(name for name, _, _ in self.uploads))
+        # every thread uploads with a key of its own
+        threads = {}
+        for name, key, thread in self.uploads:
+            self.assertEqual(threads.setdefault(key, thread), thread)
+
+    def test_gzip_renamed_key(self):
+        command, output = self.sync_s3(concurrency=4, gzip=True, renamegzip=True)
+
+        self.assertIn("Uploading css/site.css...\n", output)
+        gzipped = [name for name in command.uploaded_files if name.startswith('css/')]
+        self.assertEqual(len(gzipped), 1)
+        self.assertNotEqual(gzipped[0], 'css/site.css')
+        self.assertTrue(gzipped[0].endswith('gz'))
+        self.assertIn(gzipped[0], [name for name, _, _ in self.uploads])
+
+    def test_list_with_prefix(self):
+        modified = 1262304000  # 2010-01-01 00:00:00 UTC
+        for name in ['file00.txt', 'file01.txt']:
+            os.utime(os.path.join(self.media_root, name), (modified, modified))
+        listing = []
+        for name, last_modified in [
+            ('static/file00.txt', '2011-01-01T00:00:00.000Z'),
+            ('static/file01.txt', '2009-12-31T23:59:59.000Z'),
+        ]:
+            s3_key = boto.s3.key.Key(self.bucket, name)
+            s3_key.last_modified = last_modified
+            listing.append(s3_key)
+        self.bucket.list.return_value = listing
+
+        command, output = self.sync_s3(prefix='static', verbosity=2)
+
+        self.bucket.list.assert_called_once_with(prefix='static/')
+        self.assertEqual(command.skip_count, 1)
+        self.assertEqual(command.upload_count, 20)
+        self.assertIn("File static/file00.txt hasn't been modified since last being uploaded\n", output)
+        self.assertNotIn('static/file00.txt', command.uploaded_files)
+        self.assertIn('static/file01.txt', command.uploaded_files)
+        self.assertIn('static/css/site.css', command.uploaded_files)
+
+    def test_force_does_not_list(self):
+        command, output = self.sync_s3(force=True)
+
+        self.assertFalse(self.bucket.list.called)
+        self.assertEqual(command.upload_count, 21)
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import six
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.signals import pre_delete
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from django_extensions.management.commands.syncdata import Command, iter_json
+
+from .testapp.models import Name, Note, Person
+
+
+class SyncDataTests(TestCase):
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = six.StringIO()
+        self.tmpdir = tempfile.mkdtemp()
+        self.fixture = os.path.join(self.tmpdir, 'names.json')
+        self.deleted = []
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        shutil.rmtree(self.tmpdir)
+
+    def write_fixture(self, names):
+        with open(self.fixture, 'w') as f:
+            json.dump([{'model': 'django_extensions.name', 'pk': name.pk, 'fields': {'name': name.name}} for name in names], f)
+
+    def receiver(self, sender, instance, **kwargs):
+        self.deleted.append(instance.pk)
+
+    def test_remove_objects_not_in(self):
+        names = [Name.objects.create(name='Name %d' % i) for i in range(5)]
+        self.write_fixture(names[:2])
+
+        pre_delete.connect(self.receiver, sender=Name)
+        try:
+            call_command('syncdata', self.fixture, verbosity=0)
+        finally:
+            pre_delete.disconnect(self.receiver, sender=Name)
+
+        self.assertEqual(sorted(Name.objects.values_list('pk', flat=True)), [names[0].pk, names[1].pk])
+        self.assertEqual(sorted(self.deleted), [name.pk for name in names[2:]])
+
+    def test_skip_delete_signals(self):
+        names = [Name.objects.create(name='Name %d' % i) for i in range(5)]
+
+        pre_delete.connect(self.receiver, sender=Name)
+        try:
+            # one query for the primary keys and one for the delete
+            with self.assertNumQueries(2):
+                Command().remove_objects_not_in({Name: set([names[0].pk, names[1].pk])}, 0, delete_signals=False)
+        finally:
+            pre_delete.disconnect(self.receiver, sender=Name)
+
+        self.assertEqual(sorted(Name.objects.values_list('pk', flat=True)), [names[0].pk, names[1].pk])
+        self.assertEqual(self.deleted, [])
+
+    def test_upsert(self):
+        names = [Name.objects.create(name='Name %d' % i) for i in range(3)]
+        notes = [Note.objects.create(note='Note %d' % i) for i in range(2)]
+        person = Person.objects.create(name=names[0], age=30)
+        person.notes.add(notes[0])
+        other = Person.objects.create(name=names[1], age=40)
+        other.notes.add(notes[1])
+
+        fixture = [{'model': 'django_extensions.name', 'pk': name.pk, 'fields': {'name': name.name}} for name in names]
+        fixture[1]['fields']['name'] = 'Changed'
+        fixture.append({'model': 'django_extensions.name', 'pk': names[-1].pk + 1, 'fields': {'name': 'New'}})
+        fixture.extend([
+            {'model': 'django_extensions.person', 'pk': person.pk,
+             'fields': {'name': names[0].pk, 'age': 30, 'children': [], 'notes': [notes[0].pk]}},
+            {'model': 'django_extensions.person', 'pk': other.pk,
+             'fields': {'name': names[1].pk, 'age': 40, 'children': [], 'notes': [notes[0].pk, notes[1].pk]}},
+            {'model': 'django_extensions.person', 'pk': other.pk + 1,
+             'fields': {'name': names[2].pk, 'age': 50, 'children': [person.pk], 'notes': []}},
+        ])
+        fixture.extend([{'model': 'django_extensions.note', 'pk': note.pk, 'fields': {'note': note.note}} for note in notes])
+        with open(self.fixture, 'w') as f:
+            json.dump(fixture, f)
+
+        call_command('syncdata', self.fixture, upsert=True)
+
+        self.assertIn("Inserted 2, updated 2 and left 5 object(s) unchanged", sys.stdout.getvalue())
+        self.assertEqual(sorted(Name.objects.values_list('name', flat=True)), ['Changed', 'Name 0', 'Name 2', 'New'])
+        self.assertEqual(sorted(other.notes.values_list('pk', flat=True)), [notes[0].pk, notes[1].pk])
+        new = Person.objects.get(pk=other.pk + 1)
+        self.assertEqual(new.age, 50)
+        self.assertEqual(list(new.children.all()), [person])
+
+    def test_iter_json(self):
+        data = [{'model': 'django_extensions.name', 'pk': i, 'fields': {'name': 'N[a]m,e "%d"' % i}} for i in range(20)]
+        for text in (json.dumps(data), json.dumps(data, indent=4), '[]', ' [ ] '):
+            expected = json.loads(text)
+            for chunk_size in (1, 7, 64 * 1024):
+                self.assertEqual(list(iter_json(six.StringIO(text), chunk_size=chunk_size)), expected)
+
+        for text in ('', '{}', '[{"pk": 1}', '[{"pk": 1}, {"pk"'):
+            with self.assertRaises(ValueError):
+                list(iter_json(six.StringIO(text), chunk_size=4))
+
+    def test_json_lines(self):
+        names = [Name.objects.create(name='Name %d' % i) for i in range(3)]
+        fixture = os.path.join(self.tmpdir, 'names.jsonl')
+        with open(fixture, 'w') as f:
+            for name in names[1:]:
+                f.write(json.dumps({'model': 'django_extensions.name', 'pk': name.pk, 'fields': {'name': 'Changed'}}) + '\n')
+
+        call_command('syncdata', fixture, verbosity=0)
+
+        self.assertEqual(list(Name.objects.order_by('pk').values_list('pk', 'name')), [(names[1].pk, 'Changed'), (names[2].pk, 'Changed')])
+
+    def test_upsert_natural_foreign_keys(self):
+        from django.contrib.auth.models import Permission
+        from django.contrib.contenttypes.models import ContentType
+
+        # the permissions refer to content types created earlier in the same fixture
+        new_pk = ContentType.objects.order_by('-pk').values_list('pk', flat=True)[0] + 1
+        json_fixture = os.path.join(self.tmpdir, 'permissions.json')
+        with open(json_fixture, 'w') as f:
+            json.dump([
+                {'model': 'contenttypes.contenttype', 'pk': new_pk, 'fields': {'app_label': 'zz', 'model': 'yy'}},
+                {'model': 'auth.permission', 'fields': {'name': 'Can yy', 'codename': 'yy', 'content_type': ['zz', 'yy']}},
+            ], f)
+        xml_fixture = os.path.join(self.tmpdir, 'permissions.xml')
+        with open(xml_fixture, 'w') as f:
+            f.write(
+                '<?xml version="1.0" encoding="utf-8"?>\n'
+                '<django-objects version="1.0">'
+                '<object model="contenttypes.contenttype" pk="%d">'
+                '<field name="app_label" type="CharField">zz</field><field name="model" type="CharField">xx</field>'
+                '</object>'
+                '<object model="auth.permission">'
+                '<field name="name" type="CharField">Can xx</field><field name="codename" type="CharField">xx</field>'
+                '<field name="content_type" rel="ManyToOneRel" to="contenttypes.contenttype">'
+                '<natural>zz</natural><natural>xx</natural></field>'
+                '</object>'
+                '</django-objects>' % (new_pk + 1)
+            )
+
+        call_command('syncdata', json_fixture, upsert=True, remove=False, verbosity=0)
+        call_command('syncdata', xml_fixture, upsert=True, remove=False, verbosity=0)
+
+        for pk, model in ((new_pk, 'yy'), (new_pk + 1, 'xx')):
+            content_type = Permission.objects.get(codename=model).content_type
+            self.assertEqual((content_type.pk, content_type.app_label, content_type.model), (pk, 'zz', model))
+
+    def test_upsert_unchanged_objects_in_batches(self):
+        from django.core import serializers
+
+        names = [Name.objects.create(name='Name %d' % i) for i in range(20)]
+        with open(self.fixture, 'w') as f:
+            f.write(serializers.serialize('json', names))
+        xml_fixture = os.path.join(self.tmpdir, 'names.xml')
+        with open(xml_fixture, 'w') as f:
+            f.write(serializers.serialize('xml', names))
+
+        # no model looks up names by natural key, so they are compared in a single batch
+        for fixture in (self.fixture, xml_fixture):
+            with CaptureQueriesContext(connection) as queries:
+                call_command('syncdata', fixture, upsert=True, remove=False, verbosity=0)
+            table = connection.ops.quote_name(Name._meta.db_table)
+            selects = [query for query in queries.captured_queries if query['sql'].startswith('SELECT %s.' % table)]
+            self.assertEqual(len(selects), 1, fixture)
@@ -58,6 +58,13 @@ class SluggedTestModel(models.Model):
         app_label = 'django_extensions'
 
 
+class SluggedTestModelReference(models.Model):
+    slugged = models.ForeignKey(SluggedTestModel)
+
+    class Meta:
+        app_label = 'django_extensions'
+
+
 class ChildSluggedTestModel(SluggedTestModel):
     class Meta:
         app_label = 'django_extensions'